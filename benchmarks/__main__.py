@@ -0,0 +1,99 @@
+"""Runs the benchmark suite and writes machine-readable results.
+
+    python -m benchmarks -o results.json
+    python -m benchmarks -k antlr --compare results.json
+
+Each benchmark is run `--repeat` times after one warm-up run; min, median and mean wall times are reported in seconds.
+With `--compare`, results are compared to an earlier results file,
+and the exit status is nonzero if any benchmark's minimum got slower by more than `--threshold`."""
+
+import datetime
+import json
+import platform
+import statistics
+import sys
+import timeit
+
+from .suite import BENCHMARKS
+
+
+def run_benchmark(name, scale, repeat):
+    try:
+        fn = BENCHMARKS[name](scale)
+    except ImportError as err:
+        return {'skipped': str(err)}
+
+    fn()
+    times = timeit.repeat(fn, number=1, repeat=repeat)
+    return {
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'runs': len(times),
+    }
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if 'min' not in result or not old or 'min' not in old:
+            continue
+        ratio = result['min'] / old['min']
+        marker = ''
+        if ratio > 1 + threshold:
+            marker = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:<28} {old['min'] * 1000:>10.2f} ms -> {result['min'] * 1000:>10.2f} ms  x{ratio:.2f}{marker}")
+    return regressions
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    parser.add_argument('-k', '--filter', action='append', default=[],
+                        help="only run benchmarks whose name contains this string; may be repeated")
+    parser.add_argument('-s', '--scale', type=int, default=1, help="multiplier for the corpus sizes")
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-o', '--output', default=None, help="write results as JSON to this file")
+    parser.add_argument('--compare', default=None, help="compare against an earlier JSON results file")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="relative slowdown that counts as a regression in --compare, default 0.1")
+
+    args = parser.parse_args()
+
+    results = {}
+    for name in BENCHMARKS:
+        if args.filter and not any(f in name for f in args.filter):
+            continue
+        result = results[name] = run_benchmark(name, args.scale, args.repeat)
+        if 'skipped' in result:
+            print(f"{name:<28} skipped: {result['skipped']}")
+        else:
+            print(f"{name:<28} {result['min'] * 1000:>10.2f} ms (median {result['median'] * 1000:.2f} ms)")
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                    'python': sys.version,
+                    'implementation': platform.python_implementation(),
+                    'platform': platform.platform(),
+                    'scale': args.scale,
+                    'repeat': args.repeat,
+                },
+                'results': results,
+            }, f, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        print()
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
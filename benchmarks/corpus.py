@@ -0,0 +1,137 @@
+"""Deterministic synthetic inputs for the benchmarks. All generators take a seed, so corpora are reproducible."""
+
+import random
+
+TYPES = ['uint32', 'sint32', 'string', 'bool', 'MotorState', 'Subscription']
+LANGUAGES = [('Python', 'int', '0'), ('TypeScript', 'number', '0')]
+
+
+def hedgehog_messages(n, seed=0):
+    """Returns HedgehogTest source with `n` messages, each with fields, sometimes a oneof, and message classes."""
+
+    rnd = random.Random(seed)
+    parts = []
+    for i in range(n):
+        fields = []
+        label = 1
+        for j in range(rnd.randint(2, 6)):
+            specs = ''.join(
+                f'    {language}: "{type}"' + (f', "{default}"' if rnd.random() < 0.3 else '') + ';\n'
+                for language, type, default in LANGUAGES
+            )
+            rep = 'repeated ' if rnd.random() < 0.1 else ''
+            fields.append(f'  {rep}{rnd.choice(TYPES)} field{j} = {label} {{\n{specs}  }}\n')
+            label += 1
+        if rnd.random() < 0.5:
+            fields.append(f'  oneof choice {{\n'
+                          f'    sint32 relative = {label} {{\n      Python: "int";\n    }}\n'
+                          f'    sint32 absolute = {label + 1} {{\n      Python: "int";\n    }}\n'
+                          f'  }}\n')
+        params = ', '.join(f"field{j}" for j in range(2))
+        parts.append(
+            f'pkg{i % 10}.Message{i} message{i} = {i + 1} {{\n'
+            f'  """Docstring of message {i}.\n  It spans two lines."""\n\n'
+            f'{"".join(fields)}\n'
+            f'  => pkg{i % 10}.Request({params})\n    """request => reply""";\n'
+            f'  <= pkg{i % 10}.Reply({params}, [field1])\n    """reply""";\n'
+            f'}}\n\n'
+        )
+    return ''.join(parts)
+
+
+def nested_expr(depth, width=3, seed=0):
+    """Returns an ExprTest expression with parentheses nested `depth` levels, each level having `width` summands."""
+
+    rnd = random.Random(seed)
+    expr = str(rnd.randint(0, 9))
+    for _ in range(depth):
+        operands = [str(rnd.randint(0, 9)) for _ in range(width - 1)]
+        ops = [rnd.choice('+-*/') for _ in operands]
+        expr = f"({expr})" + ''.join(f" {op} {operand}" for op, operand in zip(ops, operands))
+    return expr
+
+
+def nested_set(depth, width=3, seed=0):
+    """Returns a SetTest set nested `depth` levels, each level having `width` numbers besides the nested set."""
+
+    rnd = random.Random(seed)
+    result = "{}"
+    for _ in range(depth):
+        elements = [str(rnd.randint(0, 1000)) for _ in range(width)]
+        elements.insert(rnd.randint(0, width), result)
+        result = f"{{{', '.join(elements)}}}"
+    return result
+
+
+def yaml_model(n, seed=0):
+    """Returns a YAML document with `n` classes of up to ten fields and methods each."""
+
+    rnd = random.Random(seed)
+    parts = ["classes:\n"]
+    for i in range(n):
+        parts.append(f"- name: Class{i}\n  abstract: {str(rnd.random() < 0.2).lower()}\n  members:\n")
+        for j in range(rnd.randint(1, 10)):
+            if rnd.random() < 0.5:
+                parts.append(f"  - kind: field\n    name: field{j}\n    type: {rnd.choice(TYPES)}\n")
+            else:
+                parts.append(f"  - kind: method\n    name: method{j}\n    params: [a, b]\n")
+    return ''.join(parts)
+
+
+def identifiers(n, seed=0):
+    """Returns `n` camelCase identifiers of one to five words."""
+
+    rnd = random.Random(seed)
+    words = ['analog', 'message', 'motor', 'state', 'reply', 'request', 'update', 'port', 'value', 'http2', 'io']
+    result = []
+    for _ in range(n):
+        parts = [rnd.choice(words) for _ in range(rnd.randint(1, 5))]
+        result.append(parts[0] + ''.join(part.capitalize() for part in parts[1:]))
+    return result
+
+
+def customizable_lines(n, sections, customized=True, section_lines=5):
+    """Yields `n` lines of generated code containing `sections` customizable sections.
+    If `customized` is true, the sections are non-default and have content, like a file edited by hand;
+    otherwise, they're empty default sections, like freshly generated code."""
+
+    every = max(n // max(sections, 1), 1)
+    section = 0
+    i = 0
+    while i < n:
+        if section < sections and i >= section * every:
+            if customized:
+                yield f"    // <GSL customizable: section-{section}>"
+                for j in range(section_lines):
+                    yield f"    custom code {section}.{j};"
+                yield f"    // </GSL customizable: section-{section}>"
+                i += section_lines + 2
+            else:
+                yield f"    // <default GSL customizable: section-{section} />"
+                i += 1
+            section += 1
+        else:
+            yield f"    generated code line {i};"
+            i += 1
+
+
+def pseudo_tuple_model(n, seed=0):
+    """Returns a list of pseudo tuple messages with fields, about `n` nodes in total.
+    Field types refer to other messages by name, like cross references in a real model."""
+
+    from gsl import pseudo_tuple
+
+    Message = pseudo_tuple('Message', ('name', 'fields'))
+    Field = pseudo_tuple('Field', ('name', 'type', 'label'))
+
+    rnd = random.Random(seed)
+    messages = []
+    count = 0
+    while count < n:
+        fields = [Field(f"field{j}", None, j + 1) for j in range(rnd.randint(2, 15))]
+        messages.append(Message(f"Message{len(messages)}", fields))
+        count += 1 + len(fields)
+    for message in messages:
+        for field in message.fields:
+            field.type = rnd.choice(messages).name
+    return messages
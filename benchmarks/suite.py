@@ -0,0 +1,368 @@
+"""The benchmark definitions. Each benchmark function does its setup for the given scale and returns the callable to time.
+Benchmarks that need optional dependencies or generated parsers raise `ImportError` during setup and are skipped."""
+
+import os
+import tempfile
+
+from . import corpus
+
+BENCHMARKS = {}
+
+# removed when the interpreter exits
+_output_directory = tempfile.TemporaryDirectory(prefix='gsl-bench-')
+
+
+def benchmark(name):
+    def decorator(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return decorator
+
+
+def _antlr(grammar):
+    import importlib
+    from gsl.antlr import Antlr
+
+    Lexer = getattr(importlib.import_module(f'tests.grammar.{grammar}Lexer'), f'{grammar}Lexer')
+    Parser = getattr(importlib.import_module(f'tests.grammar.{grammar}Parser'), f'{grammar}Parser')
+    Visitor = getattr(importlib.import_module(f'tests.grammar.{grammar}Visitor'), f'{grammar}Visitor')
+    return Antlr(Lexer, Parser), Visitor
+
+
+def _parse(antlr, source):
+    p = antlr.parser(antlr.input_stream(source))
+    return p.expr()
+
+
+@benchmark('antlr.parse.hedgehog')
+def antlr_parse_hedgehog(scale):
+    antlr, _ = _antlr('HedgehogTest')
+    source = corpus.hedgehog_messages(200 * scale)
+    return lambda: _parse(antlr, source)
+
+
+@benchmark('antlr.parse.expr')
+def antlr_parse_expr(scale):
+    antlr, _ = _antlr('ExprTest')
+    source = corpus.nested_expr(50, width=20 * scale)
+    return lambda: _parse(antlr, source)
+
+
+@benchmark('antlr.parse.set')
+def antlr_parse_set(scale):
+    antlr, _ = _antlr('SetTest')
+    source = corpus.nested_set(50, width=20 * scale)
+    return lambda: _parse(antlr, source)
+
+
+def _parse_threads(scale, threads):
+    import threading
+    from gsl.antlr import ParsingService
+
+    antlr, Visitor = _antlr('HedgehogTest')
+    service = ParsingService(antlr)
+    sources = [corpus.hedgehog_messages(10 * scale, seed=seed) for seed in range(8)]
+
+    def work():
+        for source in sources:
+            service.parse(antlr.input_stream(source), 'expr', Visitor())
+
+    def run():
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    return run
+
+
+@benchmark('antlr.service.1thread')
+def antlr_service_1thread(scale):
+    return _parse_threads(scale, 1)
+
+
+@benchmark('antlr.service.8threads')
+def antlr_service_8threads(scale):
+    # eight times the work of antlr.service.1thread; the same time would mean perfect scaling
+    return _parse_threads(scale, 8)
+
+
+@benchmark('antlr.parallel.hedgehog')
+def antlr_parallel_hedgehog(scale):
+    # parses and visits the same source as antlr.parse.hedgehog plus antlr.visit.hedgehog, in all CPUs
+    antlr, Visitor = _antlr('HedgehogTest')
+    source = corpus.hedgehog_messages(200 * scale)
+    return lambda: antlr.parse_parallel(source, 'message', Visitor)
+
+
+@benchmark('antlr.incremental.hedgehog')
+def antlr_incremental_hedgehog(scale):
+    # reparse after editing one message in the middle; compare with antlr.parse.hedgehog plus antlr.visit.hedgehog
+    antlr, Visitor = _antlr('HedgehogTest')
+    source = corpus.hedgehog_messages(200 * scale)
+    middle = source.index(f'message{100 * scale} =')
+    sources = [source, source[:middle] + 'edited_' + source[middle:]]
+    incremental = antlr.incremental('expr', 'message', Visitor())
+    incremental.parse(source)
+
+    def run():
+        for source in sources:
+            incremental.parse(source)
+    return run
+
+
+@benchmark('antlr.visit.hedgehog')
+def antlr_visit_hedgehog(scale):
+    antlr, Visitor = _antlr('HedgehogTest')
+    tree = _parse(antlr, corpus.hedgehog_messages(200 * scale))
+    return lambda: tree.accept(Visitor())
+
+
+@benchmark('antlr.visit.expr')
+def antlr_visit_expr(scale):
+    antlr, Visitor = _antlr('ExprTest')
+    tree = _parse(antlr, corpus.nested_expr(50, width=20 * scale))
+    return lambda: tree.accept(Visitor())
+
+
+def _full_text_nodes(scale):
+    antlr, _ = _antlr('HedgehogTest')
+    tree = _parse(antlr, corpus.hedgehog_messages(200 * scale))
+    messages = tree.message()
+    docstrings = [message.DOCSTRING() for message in messages]
+    fields = [field for message in messages for field in message.field()]
+    return messages + docstrings + fields
+
+
+@benchmark('antlr.full_text.tokens')
+def antlr_full_text_tokens(scale):
+    # the previous implementation, concatenating all tokens in the node's source interval
+    nodes = _full_text_nodes(scale)
+
+    def full_text(node):
+        if hasattr(node, 'symbol'):
+            return node.symbol.text
+        return node.parser.getTokenStream().getText(*node.getSourceInterval())
+
+    def run():
+        for _ in range(3):
+            for node in nodes:
+                full_text(node)
+    return run
+
+
+@benchmark('antlr.full_text.slice')
+def antlr_full_text_slice(scale):
+    from gsl.antlr import ParseTreeVisitor
+
+    nodes = _full_text_nodes(scale)
+    visitor = ParseTreeVisitor()
+
+    def run():
+        for node in nodes:
+            node.__dict__.pop('_full_text', None)
+        for _ in range(3):
+            for node in nodes:
+                visitor.get_full_text(node)
+    return run
+
+
+@benchmark('yaml.load')
+def yaml_load(scale):
+    from gsl.yaml import YAML
+
+    source = corpus.yaml_model(100 * scale)
+    return lambda: YAML(typ='safe').load(source)
+
+
+def _model_fields(scale):
+    model = corpus.pseudo_tuple_model(100000 * scale)
+    fields = [field for message in model for field in message.fields][:1000]
+    return model, fields
+
+
+@benchmark('model.index.build')
+def model_index_build(scale):
+    from gsl.model import ModelIndex
+
+    model = corpus.pseudo_tuple_model(100000 * scale)
+    return lambda: ModelIndex(model)
+
+
+@benchmark('model.resolve.scan')
+def model_resolve_scan(scale):
+    # resolving cross references without an index, by scanning the model for each one
+    model, fields = _model_fields(scale)
+
+    def run():
+        for field in fields:
+            next(message for message in model if message.name == field.type)
+    return run
+
+
+@benchmark('model.resolve.index')
+def model_resolve_index(scale):
+    from gsl.model import ModelIndex
+
+    model, fields = _model_fields(scale)
+    Message = type(model[0])
+
+    def run():
+        index = ModelIndex(model)
+        for field in fields:
+            index.get(Message, name=field.type)
+    return run
+
+
+def _field_table(scale):
+    from gsl.model import ModelTable
+
+    model, _ = _model_fields(scale)
+    Field = type(model[0].fields[0])
+    return model, ModelTable(Field, (field for message in model for field in message.fields))
+
+
+@benchmark('model.aggregate.scan')
+def model_aggregate_scan(scale):
+    # counting fields per referenced type and collecting the fields with a high label, from the nodes
+    model, _ = _field_table(scale)
+
+    def run():
+        counts = {}
+        for message in model:
+            for field in message.fields:
+                counts[field.type] = counts.get(field.type, 0) + 1
+        return counts, [field for message in model for field in message.fields if field.label > 10]
+    return run
+
+
+@benchmark('model.aggregate.table')
+def model_aggregate_table(scale):
+    _, table = _field_table(scale)
+    return lambda: (table.count_by('type'), table.filter(table.column('label') > 10))
+
+
+def _construct(Field, scale):
+    values = [(f"field{i}", 'uint32', i) for i in range(100000 * scale)]
+    return lambda: [Field(name, type, label) for name, type, label in values]
+
+
+@benchmark('model.construct.pseudo_tuple')
+def model_construct_pseudo_tuple(scale):
+    from gsl import pseudo_tuple
+
+    return _construct(pseudo_tuple('Field', ('name', 'type', 'label')), scale)
+
+
+@benchmark('model.construct.static')
+def model_construct_static(scale):
+    # the model class that g4v --static generates for the same fields
+    from gsl.g4v import static_class_code
+
+    namespace = {}
+    exec('\n'.join(static_class_code('Field', ('name', 'type', 'label'))), namespace)
+    return _construct(namespace['Field'], scale)
+
+
+@benchmark('strings.case')
+def strings_case(scale):
+    from gsl.strings import case
+
+    names = corpus.identifiers(10000 * scale)
+
+    def run():
+        for name in names:
+            case(camel=name, to='snake')
+            case(camel=name, to='constant')
+            case(camel=name, to='pascal')
+    return run
+
+
+def _output_file(name):
+    return os.path.join(_output_directory.name, name)
+
+
+@benchmark('print_to.100k')
+def print_to_100k(scale):
+    from gsl import print_to
+
+    file = _output_file('print_to.txt')
+    n = 100000 * scale
+
+    def run():
+        @print_to(file)
+        def code():
+            yield from corpus.customizable_lines(n, n // 100, customized=False)
+    return run
+
+
+def _generate_merge(scale, streaming):
+    from gsl import print_to, generate
+
+    file = _output_file(f'generate-{streaming}.txt')
+    n = 100000 * scale
+
+    @print_to(file)
+    def code():
+        yield from corpus.customizable_lines(n, n // 100, customized=True)
+
+    def run():
+        @generate(file, streaming=streaming)
+        def code():
+            yield from corpus.customizable_lines(n, n // 100, customized=False)
+    return run
+
+
+@benchmark('generate.merge.100k')
+def generate_merge_100k(scale):
+    return _generate_merge(scale, False)
+
+
+@benchmark('generate.stream.100k')
+def generate_stream_100k(scale):
+    return _generate_merge(scale, True)
+
+
+@benchmark('templates.lines')
+def templates_lines(scale):
+    from .templates import make_model, lines_code
+
+    model = make_model(100 * scale, 100)
+    return lambda: list(lines_code(model))
+
+
+@benchmark('templates.template')
+def templates_template(scale):
+    from .templates import make_model, template_code
+
+    model = make_model(100 * scale, 100)
+    return lambda: list(template_code(model))
+
+
+def _render_outputs(scale, cached):
+    from gsl import fragment
+    from .templates import make_model, template_code
+
+    model = make_model(100 * scale, 100)
+
+    def class_code(class_model):
+        return template_code([class_model])
+    if cached:
+        class_code = fragment(class_code, maxsize=None)
+
+    def run():
+        # five outputs rendering the same class declarations
+        for _ in range(5):
+            for class_model in model:
+                list(class_code(class_model))
+    return run
+
+
+@benchmark('templates.outputs.uncached')
+def templates_outputs_uncached(scale):
+    return _render_outputs(scale, False)
+
+
+@benchmark('templates.outputs.fragment')
+def templates_outputs_fragment(scale):
+    return _render_outputs(scale, True)
@@ -0,0 +1,91 @@
+"""Compares the `yield from lines(f\"\"\"...\"\"\")` idiom from the examples against precompiled `template`s.
+Run as `python -m benchmarks.templates` from the repository root."""
+
+import timeit
+
+from gsl import pseudo_tuple, lines, template
+
+Class = pseudo_tuple('Class', ('name', 'members',))
+Field = pseudo_tuple('Field', ('name',))
+Method = pseudo_tuple('Method', ('name',))
+
+
+def make_model(classes, members):
+    return [
+        Class(f"Class{i}", [
+            Field(f"field{j}") if j % 2 == 0 else Method(f"method{j}")
+            for j in range(members)
+        ])
+        for i in range(classes)
+    ]
+
+
+def lines_code(model):
+    for class_model in model:
+        yield from lines(f"""\
+public class {class_model.name} {{""")
+        for member in class_model.members:
+            if isinstance(member, Field):
+                yield from lines(f"""\
+
+    private int {member.name};""")
+            elif isinstance(member, Method):
+                yield from lines(f"""\
+
+    public void {member.name}() {{
+        // <default GSL customizable: method-{member.name}>
+        // TODO
+        // </GSL customizable: method-{member.name}>
+    }}""")
+        yield from lines(f"""\
+}}""")
+
+
+class_header = template("""\
+public class {name} {{""")
+field_code = template("""\
+
+    private int {name};""")
+method_code = template("""\
+
+    public void {name}() {{
+        // <default GSL customizable: method-{name}>
+        // TODO
+        // </GSL customizable: method-{name}>
+    }}""")
+class_footer = template("""\
+}}""")
+
+
+def template_code(model):
+    for class_model in model:
+        yield from class_header(name=class_model.name)
+        for member in class_model.members:
+            if isinstance(member, Field):
+                yield from field_code(name=member.name)
+            elif isinstance(member, Method):
+                yield from method_code(name=member.name)
+        yield from class_footer()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--classes', type=int, default=100)
+    parser.add_argument('-m', '--members', type=int, default=100)
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+
+    args = parser.parse_args()
+
+    model = make_model(args.classes, args.members)
+    if list(lines_code(model)) != list(template_code(model)):
+        raise AssertionError("template output differs from lines() output")
+
+    for name, code in [('lines', lines_code), ('template', template_code)]:
+        best = min(timeit.repeat(lambda: list(code(model)), number=1, repeat=args.repeat))
+        print(f"{name:>10}: {best * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
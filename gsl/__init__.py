@@ -1,9 +1,46 @@
+import builtins
+from collections import OrderedDict
+from collections.abc import Iterable
 from contextlib import contextmanager
+import functools
+import importlib
+import io
+import keyword
+import os
 import re
+import shutil
+from string import Formatter
+import sys
+import tempfile
 import threading
+import warnings
+import weakref
 
+from .dot_dict import DotDict
 
-def pseudo_tuple(name, fields):
+
+class _Instrumentation(threading.local):
+    profiler = None
+
+
+_instrumentation = _Instrumentation()
+
+
+@contextmanager
+def _instrumented_output(file, fn, kind):
+    profiler = _instrumentation.profiler
+    if profiler is None:
+        yield None
+    else:
+        with profiler.output(file, fn, kind) as output:
+            yield output
+
+
+# weak, so that pseudo tuples created in functions can be garbage collected
+_pseudo_tuples = weakref.WeakValueDictionary()
+
+
+def pseudo_tuple(name, fields, module=None):
     if not re.match('^[_a-zA-Z][_a-zA-Z0-9]*$', name):
         raise ValueError(f"name must be a legal identifier: {name}")
 
@@ -14,6 +51,22 @@ def pseudo_tuple(name, fields):
         if not re.match('^[a-zA-Z][_a-zA-Z0-9]*$', name):
             raise ValueError(f"name must be a legal identifier and not start with an underscore: {name}")
 
+    caller = sys._getframe(1)
+    if module is None:
+        module = caller.f_globals.get('__name__')
+    code = caller.f_code
+    if code.co_name == '<module>':
+        qualname = name
+    else:
+        # like classes defined in functions, so that those of different functions don't replace each other
+        qualname = f"{getattr(code, 'co_qualname', code.co_name)}.<locals>.{name}"
+    return _pseudo_tuple(name, tuple(fields), module, qualname, (code.co_filename, caller.f_lineno))
+
+
+def _pseudo_tuple(name, fields, module, qualname, site):
+    # identifies the class across processes, see __reduce__
+    key = (module, qualname, fields)
+
     def __init__(self, *args, **kwargs):
         if len(args) > len(fields):
             raise ValueError(f"extra positional args: {args[len(fields):]}")
@@ -41,50 +94,385 @@ def pseudo_tuple(name, fields):
         args = ', '.join(f"{k}={v!r}" for k, v in pos_items + kw_items)
         return f"{name}({args})"
 
-    return type(name, (), {
+    def __reduce__(self):
+        values = tuple(self.__dict__[field] for field in fields)
+        extra = {k: v for k, v in self.__dict__.items() if k not in fields} if len(self.__dict__) > len(fields) else None
+        return _restore_pseudo_tuple, (key, values), extra
+
+    cls = type(name, (), {
+        '__module__': module,
+        '__qualname__': qualname,
+        '_fields': fields,
+        '_site': site,
         '__init__': __init__,
         '__iter__': __iter__,
         '__str__': __str__,
         '__repr__': __repr__,
+        '__reduce__': __reduce__,
     })
+    # creating a pseudo tuple again at the same place, e.g. in a function that is called repeatedly, is expected,
+    # but instances of a different class with the same key would be unpickled as the wrong class
+    old = _pseudo_tuples.get(key)
+    if old is not None and site is not None and old._site not in (None, site):
+        warnings.warn(f"pseudo tuple {module}.{qualname}{fields} replaces one defined at {old._site[0]}:{old._site[1]}",
+                      RuntimeWarning, stacklevel=3)
+    _pseudo_tuples[key] = cls
+    return cls
+
+
+def _pseudo_tuple_class(key):
+    try:
+        return _pseudo_tuples[key]
+    except KeyError:
+        pass
+
+    # importing the defining module registers module level pseudo tuples, e.g. those of g4v generated visitors
+    module, qualname, fields = key
+    if module is not None and module != '__main__':
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+    try:
+        return _pseudo_tuples[key]
+    except KeyError:
+        # e.g. a pseudo tuple defined in a function: recreate it with the same fields
+        return _pseudo_tuple(qualname.rpartition('.')[2], fields, module, qualname, None)
+
+
+def _restore_pseudo_tuple(key, values):
+    cls = _pseudo_tuple_class(key)
+    self = cls.__new__(cls)
+    self.__dict__.update(zip(key[2], values))
+    return self
 
 
 def lines(str):
+    profiler = _instrumentation.profiler
+    if profiler is not None:
+        code = sys._getframe(1).f_code
+        return profiler.fragment(getattr(code, 'co_qualname', code.co_name), str.splitlines())
+    return _lines(str)
+
+
+def _lines(str):
     yield from str.splitlines()
 
 
+def template(str, name=None):
+    """Compiles a template with `str.format` placeholders into a line generator function taking them as keywords."""
+
+    if name is None:
+        caller = sys._getframe(1)
+        name = f"{caller.f_globals.get('__name__')}:{caller.f_lineno}"
+
+    formatter = Formatter()
+    params = []
+    body = []
+
+    def param(field_name):
+        m = re.match(r'^([^.[]*)((?:\.[^.[]+|\[[^]]+\])*)$', field_name)
+        if not m or not re.match('^[a-zA-Z][_a-zA-Z0-9]*$', m.group(1)):
+            raise ValueError(f"placeholders must be named by a legal identifier"
+                             f" that does not start with an underscore: {{{field_name}}}")
+        if keyword.iskeyword(m.group(1)):
+            raise ValueError(f"placeholders must not be named by a keyword: {{{field_name}}}")
+        name, rest = m.groups()
+        if name not in params:
+            params.append(name)
+
+        expr = name
+        for m in re.finditer(r'\.([^.[]+)|\[([^]]+)\]', rest):
+            attr, key = m.groups()
+            expr += f".{attr}" if attr is not None else f"[{int(key) if key.isdigit() else key!r}]"
+        if expr == name:
+            return expr
+
+        # item access can't be nested in an f-string expression in all supported versions, so use a local
+        local = f"_{len(body)}"
+        body.append(f"    {local} = {expr}")
+        return local
+
+    for line in str.splitlines():
+        parsed = list(formatter.parse(line))
+        if all(field_name is None for _, field_name, _, _ in parsed):
+            body.append(f"    yield {line.replace('{{', '{').replace('}}', '}')!r}")
+            continue
+
+        parts = []
+        for literal, field_name, spec, conversion in parsed:
+            parts.append(literal.replace('{', '{{').replace('}', '}}'))
+            if field_name is not None:
+                expr = param(field_name)
+                for _, nested, _, _ in formatter.parse(spec):
+                    if nested is not None:
+                        param(nested)
+                parts.append(f"{{{expr}{'!' + conversion if conversion else ''}{':' + spec if spec else ''}}}")
+        fstring = 'f' + repr(''.join(parts))
+
+        [(indent, field_name, spec, conversion), *rest] = parsed
+        if not rest and not spec and not conversion and (indent == '' or indent.isspace()):
+            value = parts[1][1:-1]
+            body.append(f"    if _isinstance({value}, _Iterable) and not _isinstance({value}, _str):")
+            body.append(f"        for _line in {value}:")
+            body.append(f"            yield {indent!r} + _line if _line else _line")
+            body.append(f"    else:")
+            body.append(f"        yield {fstring}")
+        else:
+            body.append(f"    yield {fstring}")
+
+    signature = f"*, {', '.join(params)}" if params else ""
+    arguments = ', '.join(f"{param}={param}" for param in params)
+    # placeholders become parameters, so everything else the generated code uses has an underscore name
+    namespace = {'_instrumentation': _instrumentation, '_name': name,
+                 '_isinstance': isinstance, '_Iterable': Iterable, '_str': builtins.str}
+    exec('\n'.join([
+        f"def _render({signature}):", *body, "    yield from ()",
+        f"def template({signature}):",
+        f"    _profiler = _instrumentation.profiler",
+        f"    if _profiler is not None:",
+        f"        return _profiler.fragment(_name, _render({arguments}))",
+        f"    return _render({arguments})",
+    ]), namespace)
+    return namespace['template']
+
+
+def fragment(fn=None, *, key=None, maxsize=128):
+    """Caches the lines of the decorated line generator function, by argument identity or `key`."""
+
+    if fn is None:
+        return lambda fn: fragment(fn, key=key, maxsize=maxsize)
+
+    name = getattr(fn, '__qualname__', fn.__name__)
+    cache = OrderedDict()
+    lock = threading.Lock()
+    stats = {'hits': 0, 'misses': 0}
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if key is None:
+            # the arguments are kept alive by the cache entry, so their ids are not reused while it exists
+            cache_key = tuple(map(id, args)), tuple((k, id(v)) for k, v in sorted(kwargs.items()))
+        else:
+            cache_key = key(*args, **kwargs)
+
+        with lock:
+            entry = cache.get(cache_key)
+            if entry is not None:
+                cache.move_to_end(cache_key)
+                stats['hits'] += 1
+        if entry is None:
+            entry = (args, kwargs) if key is None else None, list(fn(*args, **kwargs))
+            with lock:
+                stats['misses'] += 1
+                cache[cache_key] = entry
+                if maxsize is not None and len(cache) > maxsize:
+                    cache.popitem(last=False)
+
+        _, result = entry
+        profiler = _instrumentation.profiler
+        if profiler is not None:
+            return list(profiler.fragment(name, result))
+        return list(result)
+
+    def cache_info():
+        with lock:
+            return DotDict(hits=stats['hits'], misses=stats['misses'], maxsize=maxsize, size=len(cache))
+
+    def cache_clear():
+        with lock:
+            cache.clear()
+            stats['hits'] = stats['misses'] = 0
+
+    wrapper.cache_info = cache_info
+    wrapper.cache_clear = cache_clear
+    return wrapper
+
+
 def printlines(lines, end='\n', file=None):
-    for line in lines:
-        print(line, end=end, file=file)
+    with _instrumented_output(file, lines, 'printlines') as output:
+        if output is not None:
+            lines = output.count(lines, end, file)
+        for line in lines:
+            print(line, end=end, file=file)
 
 
 def print_to(file, mode='w'):
     def decorator(fn):
-        with open(file, mode) as f:
+        with _instrumented_output(file, fn, 'print_to'), open(file, mode) as f:
             printlines(fn(), file=f)
     return decorator
 
 
-def generate(file):
-    EMPTY, OPEN, CLOSE = 'empty', 'open', 'close'
+_EMPTY, _OPEN, _CLOSE = 'empty', 'open', 'close'
+
+
+def _marker_match(line):
+    return re.search(r'<(default )?GSL customizable: ([-\w]+)( /)?>|</GSL customizable: ([-\w]+)>', line)
+
+
+def _marker_info(m):
+    default = m.group(1) is not None
+    opening = m.group(2) is not None
+    self_closing = m.group(3) is not None
+    name = m.group(2) if opening else m.group(4)
+
+    return name, _EMPTY if self_closing else _OPEN if opening else _CLOSE, default if opening else None
+
+
+def _marker_format(m, name, mode, default):
+    prefix = '/' if mode == _CLOSE else 'default ' if default else ''
+    suffix = ' /' if mode == _EMPTY else ''
+    return f'{m.string[:m.start()]}<{prefix}GSL customizable: {name}{suffix}>{m.string[m.end():]}'
+
+
+def _scan(f):
+    # yields (name, lines or None) per customized section; like with groupby, consume lines before advancing
+    lines = enumerate(f, start=1)
+    sections = set()
+    i = 0
 
-    def marker_match(line):
-        return re.search(r'<(default )?GSL customizable: ([-\w]+)( /)?>|</GSL customizable: ([-\w]+)>', line)
+    def content(name):
+        nonlocal i
+        for i, line in lines:
+            m = _marker_match(line)
+            if m:
+                other, mode, _ = _marker_info(m)
+                if mode != _CLOSE:
+                    raise ValueError(f"Line {i} (old): nested customizable '{other}'")
+                elif other != name:
+                    raise ValueError(f"Line {i} (old): closing unopened customizable '{other}'"
+                                     f" (open customizable is '{name}')")
+                return
+            yield line.rstrip('\r\n')
+        raise ValueError(f"Line {i} (old): unclosed customizable '{name}'")
 
-    def marker_info(m):
-        default = m.group(1) is not None
-        opening = m.group(2) is not None
-        self_closing = m.group(3) is not None
-        name = m.group(2) if opening else m.group(4)
+    for i, line in lines:
+        m = _marker_match(line)
+        if m:
+            name, mode, default = _marker_info(m)
+            if mode == _CLOSE:
+                raise ValueError(f"Line {i} (old): closing unopened customizable '{name}'")
+            if name in sections:
+                raise ValueError(f"Line {i} (old): duplicate customizable '{name}'")
+            if not default:
+                sections.add(name)
+
+            if mode == _EMPTY:
+                if not default:
+                    yield name, None
+            else:
+                section = content(name)
+                if not default:
+                    yield name, section
+                for _ in section:
+                    pass
+
+
+def _index(f):
+    return {name: None if content is None else list(content) for name, content in _scan(f)}
+
+
+class _Merge(object):
+    # merges generated lines, fed one at a time, with the old sections; customized(name) returns (found, lines)
+
+    def __init__(self, customized):
+        self.customized = customized
+        self.new_sections = set()
+        self.open_section = None
+        self.skip = False
+        self.i = 0
+
+    def feed(self, line):
+        # returns the lines to output for the given generated line
+        self.i += 1
+        m = _marker_match(line)
+        if m:
+            return self.marker(m)
+        return () if self.skip else (line,)
+
+    def marker(self, m):
+        i = self.i
+        name, mode, default = _marker_info(m)
+        if mode == _CLOSE:
+            if not self.open_section:
+                raise ValueError(f"Line {i} (new): closing unopened customizable '{name}'")
+            elif name != self.open_section:
+                raise ValueError(f"Line {i} (new): closing unopened customizable '{name}'"
+                                 f" (open customizable is '{self.open_section}')")
+
+            if not self.skip:
+                yield _marker_format(m, name, _CLOSE, None)
+
+            self.open_section = None
+            self.skip = False
+        else:
+            if self.open_section:
+                raise ValueError(f"Line {i} (new): nested customizable '{name}'")
+            if name in self.new_sections:
+                raise ValueError(f"Line {i} (new): duplicate customizable '{name}'")
+            if not default:
+                raise ValueError(f"Line {i} (new): generated code must declare sections as `default`")
+            self.new_sections.add(name)
 
-        return name, EMPTY if self_closing else OPEN if opening else CLOSE, default if opening else None
+            found, content = self.customized(name)
+            if not found:
+                yield _marker_format(m, name, mode, True)
+            elif content is None:
+                yield _marker_format(m, name, _EMPTY, False)
+            else:
+                yield _marker_format(m, name, _OPEN, False)
+                yield from content
+                yield _marker_format(m, name, _CLOSE, None)
 
-    def marker_format(m, name, mode, default):
-        prefix = '/' if mode == CLOSE else 'default ' if default else ''
-        suffix = ' /' if mode == EMPTY else ''
-        return f'{m.string[:m.start()]}<{prefix}GSL customizable: {name}{suffix}>{m.string[m.end():]}'
+            if mode == _OPEN:
+                self.open_section = name
+                self.skip = found
+
+    def close(self):
+        if self.open_section:
+            raise ValueError(f"Line {self.i} (new): unclosed customizable '{self.open_section}'")
+
+    def merged(self, lines):
+        for line in lines:
+            yield from self.feed(line)
+        self.close()
+
+
+def _section_stats(output, old_sections, new_sections):
+    if output is not None:
+        output.sections.update(
+            preserved=len(new_sections & old_sections),
+            reset=len(new_sections - old_sections),
+            dropped=len(old_sections - new_sections),
+        )
+
+
+def _temp_file(file):
+    """Creates an empty file next to `file` with its permissions, to replace it with `os.replace` once written."""
+
+    fd, temp = tempfile.mkstemp(prefix=f"{os.path.basename(file)}.", suffix='.gsl-new',
+                                dir=os.path.dirname(file) or '.')
+    os.close(fd)
+    try:
+        shutil.copymode(file, temp)
+    except FileNotFoundError:
+        # mkstemp creates the file only readable by its owner; give it the permissions `open` would
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp, 0o666 & ~umask)
+    return temp
+
+
+def generate(file, streaming=False):
+    """Writes the decorated function's lines to `file`, keeping customized sections of the existing file."""
 
     def decorator(fn):
+        with _instrumented_output(file, fn, 'generate') as output:
+            old_sections, new_sections = merge_streaming(fn) if streaming else merge_indexed(fn)
+            _section_stats(output, old_sections, new_sections)
+
+    def merge_indexed(fn):
         sections = {}
         try:
             f = open(file)
@@ -92,103 +480,55 @@ def generate(file):
             pass
         else:
             with f:
-                open_section = None
-                for i, line in enumerate(f, start=1):
-                    m = marker_match(line)
-                    if m:
-                        name, mode, default = marker_info(m)
-                        if mode == CLOSE:
-                            if not open_section:
-                                raise ValueError(f"Line {i} (old): closing unopened customizable '{name}'")
-                            elif name != open_section:
-                                raise ValueError(f"Line {i} (old): closing unopened customizable '{name}'"
-                                                 f" (open customizable is '{open_section}')")
-
-                            open_section = None
-                        elif mode == OPEN:
-                            if open_section:
-                                raise ValueError(f"Line {i} (old): nested customizable '{name}'")
-                            if name in sections:
-                                raise ValueError(f"Line {i} (old): duplicate customizable '{name}'")
-                            if not default:
-                                sections[name] = []
-
-                            open_section = name
-                        elif mode == EMPTY:
-                            if open_section:
-                                raise ValueError(f"Line {i} (old): nested customizable '{name}'")
-                            if name in sections:
-                                raise ValueError(f"Line {i} (old): duplicate customizable '{name}'")
-                            if not default:
-                                sections[name] = None
-                    elif open_section and open_section in sections:
-                        sections[open_section].append(line.rstrip('\r\n'))
-                if open_section:
-                    raise ValueError(f"Line {i} (old): unclosed customizable '{open_section}'")
+                sections = _index(f)
+
+        merge = _Merge(lambda name: (name in sections, sections.get(name)))
 
         @print_to(file)
         def code():
-            open_section = None
-            new_sections = set()
-            skip = False
-            for i, line in enumerate(fn(), start=1):
-                m = marker_match(line)
-                if m:
-                    name, mode, default = marker_info(m)
-                    if mode == CLOSE:
-                        if not open_section:
-                            raise ValueError(f"Line {i} (new): closing unopened customizable '{name}'")
-                        elif name != open_section:
-                            raise ValueError(f"Line {i} (new): closing unopened customizable '{name}'"
-                                             f" (open customizable is '{open_section}')")
-
-                        if not skip:
-                            yield marker_format(m, name, CLOSE, None)
-
-                        open_section = None
-                        skip = False
-                    elif mode == OPEN:
-                        if open_section:
-                            raise ValueError(f"Line {i} (new): nested customizable '{name}'")
-                        if name in new_sections:
-                            raise ValueError(f"Line {i} (new): duplicate customizable '{name}'")
-                        if not default:
-                            raise ValueError(f"Line {i} (new): generated code must declare sections as `default`")
-                        new_sections.add(name)
-
-                        if name in sections:
-                            if sections[name] is None:
-                                yield marker_format(m, name, EMPTY, False)
-                            else:
-                                yield marker_format(m, name, OPEN, False)
-                                yield from sections[name]
-                                yield marker_format(m, name, CLOSE, None)
-                        else:
-                            yield marker_format(m, name, OPEN, True)
-
-                        open_section = name
-                        skip = name in sections
-                    elif mode == EMPTY:
-                        if open_section:
-                            raise ValueError(f"Line {i} (new): nested customizable '{name}'")
-                        if name in new_sections:
-                            raise ValueError(f"Line {i} (new): duplicate customizable '{name}'")
-                        if not default:
-                            raise ValueError(f"Line {i} (new): generated code must declare sections as `default`")
-                        new_sections.add(name)
-
-                        if name in sections:
-                            if sections[name] is None:
-                                yield marker_format(m, name, EMPTY, False)
-                            else:
-                                yield marker_format(m, name, OPEN, False)
-                                yield from sections[name]
-                                yield marker_format(m, name, CLOSE, None)
-                        else:
-                            yield marker_format(m, name, EMPTY, True)
-                elif not skip:
-                    yield line
-            if open_section:
-                raise ValueError(f"Line {i} (new): unclosed customizable '{open_section}'")
+            yield from merge.merged(fn())
+
+        return sections.keys(), merge.new_sections
+
+    def merge_streaming(fn):
+        try:
+            f = open(file)
+        except FileNotFoundError:
+            f = io.StringIO()
+
+        old_sections = set()
+        indexed = {}
+        with f:
+            old = _scan(f)
+
+            def customized(name):
+                if name in indexed:
+                    return True, indexed.pop(name)
+                for old_name, content in old:
+                    old_sections.add(old_name)
+                    if old_name == name:
+                        return True, content
+                    indexed[old_name] = None if content is None else list(content)
+                return False, None
+
+            merge = _Merge(customized)
+            new_file = _temp_file(file)
+            try:
+                @print_to(new_file)
+                def code():
+                    yield from merge.merged(fn())
+
+                # validate the rest of the old file
+                for old_name, _ in old:
+                    old_sections.add(old_name)
+            except BaseException:
+                try:
+                    os.remove(new_file)
+                except FileNotFoundError:
+                    pass
+                raise
+
+        os.replace(new_file, file)
+        return old_sections, merge.new_sections
 
     return decorator
@@ -0,0 +1,106 @@
+"""Async counterparts of `print_to` and `generate` that do file I/O in a thread pool."""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+from . import _Merge, _index, _temp_file
+
+MAX_WORKERS = 4
+CHUNK_LINES = 1024
+
+_executor = None
+
+
+def default_executor():
+    """Returns the thread pool used when no executor is given, creating it with `MAX_WORKERS` threads on first use."""
+
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='gsl-io')
+    return _executor
+
+
+async def _alines(lines):
+    if hasattr(lines, '__aiter__'):
+        async for line in lines:
+            yield line
+    else:
+        for line in lines:
+            yield line
+
+
+async def _write(file, mode, lines, executor):
+    loop = asyncio.get_running_loop()
+
+    def write(f, chunk):
+        f.write(''.join(f"{line}\n" for line in chunk))
+
+    f = await loop.run_in_executor(executor, open, file, mode)
+    pending = None
+    try:
+        chunk = []
+        async for line in lines:
+            chunk.append(line)
+            if len(chunk) >= CHUNK_LINES:
+                if pending is not None:
+                    await pending
+                pending = loop.run_in_executor(executor, write, f, chunk)
+                chunk = []
+        if pending is not None:
+            await pending
+        pending = loop.run_in_executor(executor, write, f, chunk)
+        await pending
+    finally:
+        if pending is not None and not pending.done():
+            await asyncio.wait([pending])
+        await loop.run_in_executor(executor, f.close)
+
+
+def aprint_to(file, mode='w', *, executor=None):
+    """Writes the lines of the decorated (async) generator function to `file`; returns a task to await."""
+
+    def decorator(fn):
+        return asyncio.ensure_future(_write(file, mode, _alines(fn()), executor or default_executor()))
+    return decorator
+
+
+def agenerate(file, *, executor=None):
+    """Like `generate`, but for (async) generator functions; returns a task to await."""
+
+    def read_sections():
+        try:
+            f = open(file)
+        except FileNotFoundError:
+            return {}
+        with f:
+            return _index(f)
+
+    async def merged(fn, merge):
+        async for line in _alines(fn()):
+            for out in merge.feed(line):
+                yield out
+        merge.close()
+
+    def remove(new_file):
+        try:
+            os.remove(new_file)
+        except FileNotFoundError:
+            pass
+
+    async def run(fn, executor):
+        loop = asyncio.get_running_loop()
+        sections = await loop.run_in_executor(executor, read_sections)
+        merge = _Merge(lambda name: (name in sections, sections.get(name)))
+        # like generate's streaming mode, only replace the old file once generation succeeded
+        new_file = await loop.run_in_executor(executor, _temp_file, file)
+        try:
+            await _write(new_file, 'w', merged(fn, merge), executor)
+        except BaseException:
+            await loop.run_in_executor(executor, remove, new_file)
+            raise
+        await loop.run_in_executor(executor, os.replace, new_file, file)
+
+    def decorator(fn):
+        return asyncio.ensure_future(run(fn, executor or default_executor()))
+    return decorator
@@ -1,17 +1,65 @@
-from antlr4 import InputStream, FileStream, CommonTokenStream
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import importlib
+import os.path
+import pickle
+import re
+import sys
+import threading
+import time
+
+from antlr4 import InputStream, FileStream, CommonTokenStream, ParserRuleContext, Token
+from antlr4.ListTokenSource import ListTokenSource
+from antlr4.PredictionContext import PredictionContextCache
+from antlr4.atn.LexerATNSimulator import LexerATNSimulator
+from antlr4.atn.ParserATNSimulator import ParserATNSimulator
+from antlr4.dfa.DFA import DFA
 from antlr4.error.Errors import ParseCancellationException
 from antlr4.error.ErrorListener import ErrorListener
+from antlr4.tree.Tree import ParseTreeListener
 from .dot_dict import DotDict
 
 
+class SymbolTable(object):
+    """Interns token texts per parse, and numbers the distinct texts in order of first occurrence."""
+
+    def __init__(self):
+        self.symbols = []
+        self._ids = {}
+
+    def intern(self, text):
+        return self.symbols[self.id(text)]
+
+    def id(self, text):
+        try:
+            return self._ids[text]
+        except KeyError:
+            id = self._ids[text] = len(self.symbols)
+            self.symbols.append(text)
+            return id
+
+    def __getitem__(self, id):
+        return self.symbols[id]
+
+    def __contains__(self, text):
+        return text in self._ids
+
+    def __len__(self):
+        return len(self.symbols)
+
+
 class ParseTreeVisitor(object):
+    def __init__(self, symbols=None):
+        # if given a SymbolTable, token texts in the visitor's output are interned through it
+        self.symbols = symbols
+
     # mandatory visitor methods
 
     def visitChildren(self, node, *types):
         return self.visitNodes(self.get_children(node, *types))
 
     def visitTerminal(self, node):
-        return node.symbol.text
+        return self.visitToken(node.symbol)
 
     def visitErrorNode(self, node):
         return None
@@ -24,11 +72,33 @@ class ParseTreeVisitor(object):
     def visitNodes(self, nodes):
         return [node.accept(self) for node in nodes]
 
+    def streamNodes(self, nodes):
+        """Like `visitNodes`, but visits lazily and releases each visited node's subtree."""
+
+        for node in nodes:
+            model = self.visitNode(node)
+            self.release(node)
+            yield model
+
     def visitNode(self, node):
+        # token labels refer to tokens, not terminal nodes
+        if isinstance(node, Token):
+            return self.visitToken(node)
         return node.accept(self)
 
+    def visitToken(self, token):
+        if self.symbols is None:
+            return token.text
+        return self.symbols.intern(token.text)
+
     # auxillary methods
 
+    def release(self, node):
+        if isinstance(node, ParserRuleContext):
+            node.children = None
+            # labels (and cached full text) are instance attributes of generated contexts
+            node.__dict__.clear()
+
     def get_children(self, node, *types):
         return (child for child in node.getChildren() if len(types) == 0 or isinstance(child, types))
 
@@ -64,7 +134,23 @@ class ParseTreeVisitor(object):
         return node.getText()
 
     def get_full_text(self, node):
-        return node.parser.getTokenStream().getText(node.getSourceInterval())
+        # slice the input between the start and stop tokens' characters, instead of concatenating the tokens in between;
+        # this is independent of the subtree's size, works without hidden tokens, and is cached on the node
+        try:
+            return node._full_text
+        except AttributeError:
+            pass
+
+        symbol = getattr(node, 'symbol', None)
+        start, stop = (symbol, symbol) if symbol is not None else (node.start, node.stop)
+        if stop is None or stop.stop < start.start:
+            text = ""
+        else:
+            input = start.getInputStream()
+            data = getattr(input, 'strdata', None)
+            text = data[start.start:stop.stop + 1] if data is not None else input.getText(start.start, stop.stop)
+        node._full_text = text
+        return text
 
 
 class DotDictVisitorMixin(object):
@@ -100,6 +186,143 @@ def dot_dict_visitor(_Parser, _Visitor):
     return Visitor
 
 
+class ModelListener(ParseTreeListener):
+    """Builds models while parsing, calling `build<Rule>(ctx, children)` when a rule is exited."""
+
+    def __init__(self, symbols=None):
+        # if given a SymbolTable, token texts in the model are interned through it
+        self.symbols = symbols
+        self._builders = {}
+        # (context, children) entries for the contexts on the rule invocation stack that already have children
+        self._stack = [(None, [])]
+        # contexts that were built when a left recursive rule made them the first child of a new context
+        self._unrolled = {}
+
+    @property
+    def model(self):
+        _, children = self._stack[0]
+        return children[-1][1] if children else None
+
+    def _children(self, ctx):
+        ctx_, children = self._stack[-1]
+        if ctx_ is not ctx:
+            children = []
+            self._stack.append((ctx, children))
+        return children
+
+    def _build(self, ctx, children):
+        cls = type(ctx)
+        try:
+            build = self._builders[cls]
+        except KeyError:
+            name = cls.__name__
+            if name.endswith('Context'):
+                name = name[:-len('Context')]
+            build = self._builders[cls] = getattr(self, f"build{name}", None)
+        if build is None:
+            return self.get_models(children)
+        return build(ctx, children)
+
+    # listener methods
+
+    def enterEveryRule(self, ctx):
+        # pushNewRecursionContext makes the current context of a left recursive rule the first child of a new one.
+        # Generated parsers exit the current context first; if it is still open, it is complete anyway
+        previous, children = self._stack[-1]
+        if previous is not None and previous.parentCtx is ctx:
+            self._stack.pop()
+            self._unrolled[id(previous)] = previous
+            self._stack.append((ctx, [(previous, self._build(previous, children))]))
+        elif children and getattr(children[-1][0], 'parentCtx', None) is ctx:
+            previous = children.pop()
+            self._children(ctx).append(previous)
+
+    def exitEveryRule(self, ctx):
+        if self._unrolled.pop(id(ctx), None) is ctx:
+            # already built when its recursion context was pushed
+            return
+        previous, children = self._stack[-1]
+        if previous is ctx:
+            self._stack.pop()
+        else:
+            children = []
+        self._children(ctx.parentCtx).append((ctx, self._build(ctx, children)))
+        if len(self._stack) == 1:
+            self._unrolled.clear()
+
+    def visitTerminal(self, node):
+        self._children(node.parentCtx).append((node.symbol, None))
+
+    def visitErrorNode(self, node):
+        pass
+
+    # model building methods
+
+    def visitToken(self, token):
+        if self.symbols is None:
+            return token.text
+        return self.symbols.intern(token.text)
+
+    def _model(self, node, model):
+        return self.visitToken(node) if isinstance(node, Token) else model
+
+    def get_models(self, children, *types):
+        return [self._model(node, model) for node, model in children if len(types) == 0 or isinstance(node, types)]
+
+    def get_model(self, children, *types):
+        model, = self.get_models(children, *types)
+        return model
+
+    def has_children(self, children, *types):
+        return any(len(types) == 0 or isinstance(node, types) for node, _ in children)
+
+    def get_tokens(self, children, type):
+        return [self.visitToken(node) for node, _ in children if isinstance(node, Token) and node.type == type]
+
+    def get_token(self, children, type):
+        for node, _ in children:
+            if isinstance(node, Token) and node.type == type:
+                return self.visitToken(node)
+        return None
+
+    def has_token(self, children, type):
+        return any(isinstance(node, Token) and node.type == type for node, _ in children)
+
+    def get_ref(self, children, ref):
+        # resolves a label, which refers to a token or to one of the children's contexts
+        if ref is None:
+            return None
+        if isinstance(ref, Token):
+            return self.visitToken(ref)
+        for node, model in children:
+            if node is ref:
+                return model
+        raise ValueError(f"labeled context is not a child: {ref}")
+
+
+_hidden_free_lexers = {}
+
+
+def hidden_free_lexer(_Lexer):
+    """Returns a subclass of the lexer class that drops hidden channel tokens."""
+
+    try:
+        return _hidden_free_lexers[_Lexer]
+    except KeyError:
+        pass
+
+    class Lexer(_Lexer):
+        def nextToken(self):
+            while True:
+                token = super().nextToken()
+                if token.channel != Token.HIDDEN_CHANNEL:
+                    return token
+
+    Lexer.__name__ = Lexer.__qualname__ = f"HiddenFree{_Lexer.__name__}"
+    _hidden_free_lexers[_Lexer] = Lexer
+    return Lexer
+
+
 class BailErrorListener(ErrorListener):
     INSTANCE = None
 
@@ -110,6 +333,402 @@ class BailErrorListener(ErrorListener):
 BailErrorListener.INSTANCE = BailErrorListener()
 
 
+class CollectingErrorListener(ErrorListener):
+    def __init__(self):
+        self.errors = []
+
+    def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
+        self.errors.append((line, column, msg))
+
+
+# guards the DFA caches that all instances of a generated lexer or parser share
+_dfa_lock = threading.RLock()
+
+
+_dfa_s0 = DFA.s0
+
+
+class _LockingDFA(DFA):
+    # a DFA whose start states are only set while holding the lock; reading them doesn't take it
+    __slots__ = ()
+
+    @property
+    def s0(self):
+        return _dfa_s0.__get__(self)
+
+    @s0.setter
+    def s0(self, s0):
+        with _dfa_lock:
+            _dfa_s0.__set__(self, s0)
+
+    def setPrecedenceStartState(self, precedence, startState):
+        with _dfa_lock:
+            super().setPrecedenceStartState(precedence, startState)
+
+
+def _locking_dfas(dfas):
+    with _dfa_lock:
+        for dfa in dfas:
+            if type(dfa) is DFA:
+                dfa.__class__ = _LockingDFA
+
+
+class LockingLexerATNSimulator(LexerATNSimulator):
+    """A lexer ATN simulator that only adds to the shared DFA while holding a lock."""
+
+    def __init__(self, lexer):
+        super().__init__(lexer, lexer.atn, lexer.decisionsToDFA, PredictionContextCache())
+        _locking_dfas(lexer.decisionsToDFA)
+
+    def addDFAEdge(self, from_, tk, to=None, cfgs=None):
+        with _dfa_lock:
+            return super().addDFAEdge(from_, tk, to, cfgs)
+
+    def addDFAState(self, configs):
+        with _dfa_lock:
+            return super().addDFAState(configs)
+
+
+class LockingParserATNSimulator(ParserATNSimulator):
+    """A parser ATN simulator that only adds to the shared DFA while holding a lock."""
+
+    def __init__(self, parser):
+        super().__init__(parser, parser.atn, parser.decisionsToDFA, parser.sharedContextCache)
+        _locking_dfas(parser.decisionsToDFA)
+
+    def addDFAEdge(self, dfa, from_, t, to):
+        with _dfa_lock:
+            return super().addDFAEdge(dfa, from_, t, to)
+
+    def addDFAState(self, dfa, D):
+        with _dfa_lock:
+            return super().addDFAState(dfa, D)
+
+    def getCachedContext(self, context):
+        # the prediction context cache is shared by all instances of the parser, too
+        with _dfa_lock:
+            return super().getCachedContext(context)
+
+
+class ProfilingATNSimulator(ParserATNSimulator):
+    """A port of the Java runtime's ProfilingATNSimulator, which the Python runtime lacks."""
+
+    def __init__(self, parser):
+        super().__init__(parser, parser.atn, parser.decisionsToDFA, parser.sharedContextCache)
+        self.decisions = [
+            DotDict(
+                decision=decision,
+                rule=parser.ruleNames[parser.atn.getDecisionState(decision).ruleIndex],
+                invocations=0, time=0,
+                SLL_TotalLook=0, SLL_MinLook=0, SLL_MaxLook=0,
+                LL_TotalLook=0, LL_MinLook=0, LL_MaxLook=0,
+                SLL_DFATransitions=0, SLL_ATNTransitions=0, LL_ATNTransitions=0,
+                LL_Fallback=0, contextSensitivities=0, ambiguities=0, errors=0,
+            )
+            for decision in range(len(parser.decisionsToDFA))
+        ]
+        self._sllStopIndex = -1
+        self._llStopIndex = -1
+        self._currentDecision = -1
+        self._conflictingAltResolvedBySLL = None
+
+    def adaptivePredict(self, input, decision, outerContext):
+        try:
+            self._sllStopIndex = -1
+            self._llStopIndex = -1
+            self._currentDecision = decision
+            start = time.perf_counter_ns()
+            alt = super().adaptivePredict(input, decision, outerContext)
+            stop = time.perf_counter_ns()
+
+            info = self.decisions[decision]
+            info.time += stop - start
+            info.invocations += 1
+
+            SLL_k = self._sllStopIndex - self._startIndex + 1
+            info.SLL_TotalLook += SLL_k
+            info.SLL_MinLook = SLL_k if info.SLL_MinLook == 0 else min(info.SLL_MinLook, SLL_k)
+            info.SLL_MaxLook = max(info.SLL_MaxLook, SLL_k)
+
+            if self._llStopIndex >= 0:
+                LL_k = self._llStopIndex - self._startIndex + 1
+                info.LL_TotalLook += LL_k
+                info.LL_MinLook = LL_k if info.LL_MinLook == 0 else min(info.LL_MinLook, LL_k)
+                info.LL_MaxLook = max(info.LL_MaxLook, LL_k)
+
+            return alt
+        finally:
+            self._currentDecision = -1
+
+    def getExistingTargetState(self, previousD, t):
+        # called each time the input position advances during SLL prediction
+        self._sllStopIndex = self._input.index
+
+        existingTargetState = super().getExistingTargetState(previousD, t)
+        if existingTargetState is not None:
+            self.decisions[self._currentDecision].SLL_DFATransitions += 1
+            if existingTargetState is self.ERROR:
+                self.decisions[self._currentDecision].errors += 1
+        return existingTargetState
+
+    def computeReachSet(self, closure, t, fullCtx):
+        if fullCtx:
+            # called each time the input position advances during full context prediction
+            self._llStopIndex = self._input.index
+
+        reachConfigs = super().computeReachSet(closure, t, fullCtx)
+        info = self.decisions[self._currentDecision]
+        if fullCtx:
+            info.LL_ATNTransitions += 1
+        else:
+            info.SLL_ATNTransitions += 1
+        if reachConfigs is None:
+            info.errors += 1
+        return reachConfigs
+
+    def reportAttemptingFullContext(self, dfa, conflictingAlts, configs, startIndex, stopIndex):
+        self._conflictingAltResolvedBySLL = min(conflictingAlts or {config.alt for config in configs})
+        self.decisions[self._currentDecision].LL_Fallback += 1
+        super().reportAttemptingFullContext(dfa, conflictingAlts, configs, startIndex, stopIndex)
+
+    def reportContextSensitivity(self, dfa, prediction, configs, startIndex, stopIndex):
+        if prediction != self._conflictingAltResolvedBySLL:
+            self.decisions[self._currentDecision].contextSensitivities += 1
+        super().reportContextSensitivity(dfa, prediction, configs, startIndex, stopIndex)
+
+    def reportAmbiguity(self, dfa, D, startIndex, stopIndex, exact, ambigAlts, configs):
+        prediction = min(ambigAlts or {config.alt for config in configs})
+        if configs.fullCtx and prediction != self._conflictingAltResolvedBySLL:
+            # even though this is an ambiguity, some context sensitivities can still be detected
+            self.decisions[self._currentDecision].contextSensitivities += 1
+        self.decisions[self._currentDecision].ambiguities += 1
+        super().reportAmbiguity(dfa, D, startIndex, stopIndex, exact, ambigAlts, configs)
+
+
+class CountingATNSimulator(LockingParserATNSimulator):
+    """A locking parser ATN simulator that counts predictions and their ATN and LL fallbacks per decision."""
+
+    def __init__(self, parser):
+        super().__init__(parser)
+        self.predictions = [0] * len(parser.decisionsToDFA)
+        self.ATN_Fallback = [0] * len(parser.decisionsToDFA)
+        self.LL_Fallback = [0] * len(parser.decisionsToDFA)
+        self._fallback = False
+
+    def adaptivePredict(self, input, decision, outerContext):
+        self._fallback = False
+        try:
+            return super().adaptivePredict(input, decision, outerContext)
+        finally:
+            self.predictions[decision] += 1
+            if self._fallback:
+                self.ATN_Fallback[decision] += 1
+
+    def computeStartState(self, p, ctx, fullCtx):
+        self._fallback = True
+        return super().computeStartState(p, ctx, fullCtx)
+
+    def computeTargetState(self, dfa, previousD, t):
+        self._fallback = True
+        return super().computeTargetState(dfa, previousD, t)
+
+    def reportAttemptingFullContext(self, dfa, conflictingAlts, configs, startIndex, stopIndex):
+        self.LL_Fallback[dfa.decision] += 1
+        super().reportAttemptingFullContext(dfa, conflictingAlts, configs, startIndex, stopIndex)
+
+
+class DecisionProfile(object):
+    """The per-decision statistics of profiling parsers; times are in nanoseconds."""
+
+    SUMS = ('invocations', 'time', 'SLL_TotalLook', 'LL_TotalLook',
+            'SLL_DFATransitions', 'SLL_ATNTransitions', 'LL_ATNTransitions',
+            'LL_Fallback', 'contextSensitivities', 'ambiguities', 'errors')
+
+    def __init__(self, decisions):
+        self.decisions = decisions
+
+    @classmethod
+    def of(cls, *parsers):
+        decisions = None
+        for parser in parsers:
+            if decisions is None:
+                decisions = [DotDict(info) for info in parser._interp.decisions]
+                continue
+            for total, info in zip(decisions, parser._interp.decisions):
+                for key in cls.SUMS:
+                    total[key] += info[key]
+                for key in ('SLL_MinLook', 'LL_MinLook'):
+                    total[key] = min(filter(None, (total[key], info[key])), default=0)
+                for key in ('SLL_MaxLook', 'LL_MaxLook'):
+                    total[key] = max(total[key], info[key])
+        return cls(decisions or [])
+
+    def rules(self):
+        result = {}
+        for info in self.decisions:
+            try:
+                rule = result[info.rule]
+            except KeyError:
+                rule = result[info.rule] = DotDict(rule=info.rule, decisions=0, SLL_MaxLook=0, LL_MaxLook=0,
+                                                   **{key: 0 for key in self.SUMS})
+            rule.decisions += 1
+            for key in self.SUMS:
+                rule[key] += info[key]
+            rule.SLL_MaxLook = max(rule.SLL_MaxLook, info.SLL_MaxLook)
+            rule.LL_MaxLook = max(rule.LL_MaxLook, info.LL_MaxLook)
+        return list(result.values())
+
+    def report(self, key='time', limit=None):
+        """Yields a table of the invoked decisions, sorted descending by `key`, followed by the same per rule."""
+
+        def table(title, rows, head):
+            rows = sorted((row for row in rows if row.invocations), key=lambda row: row[key], reverse=True)
+            yield title
+            yield (f"{head:<32} {'calls':>8} {'time ms':>9} {'SLL k':>9} {'SLL max':>7} {'LL k':>9} {'LL max':>6}"
+                   f" {'LL fallbacks':>12} {'ctx sens':>8} {'ambig':>6} {'errors':>6}")
+            for row in rows[:limit]:
+                name = f"{row.rule}:{row.decision}" if 'decision' in row else row.rule
+                yield (f"{name:<32} {row.invocations:>8} {row.time / 1e6:>9.3f}"
+                       f" {row.SLL_TotalLook / row.invocations:>9.2f} {row.SLL_MaxLook:>7}"
+                       f" {row.LL_TotalLook / row.LL_Fallback if row.LL_Fallback else 0:>9.2f} {row.LL_MaxLook:>6}"
+                       f" {row.LL_Fallback:>12} {row.contextSensitivities:>8} {row.ambiguities:>6} {row.errors:>6}")
+
+        yield from table("decisions", self.decisions, "rule:decision")
+        yield ""
+        yield from table("rules", self.rules(), "rule")
+
+
+def _dfa_size(dfa):
+    while True:
+        try:
+            states = list(dfa._states)
+            break
+        except RuntimeError:
+            # parsers without a locking simulator add states without taking the lock
+            pass
+    count = len(states)
+    if dfa.s0 is not None and dfa.s0 not in dfa._states:
+        # the start state of a precedence DFA only holds edges to the start states per precedence
+        states.append(dfa.s0)
+    return count, sum(1 for state in states if state.edges for edge in state.edges if edge is not None)
+
+
+class DFAStatistics(object):
+    """The sizes of the shared lexer and parser DFAs, with the predictions of counting parsers."""
+
+    def __init__(self, decisions, modes, failures=0):
+        self.decisions = decisions
+        self.modes = modes
+        self.failures = failures
+
+    @classmethod
+    def of(cls, Lexer, Parser, *parsers):
+        decisions = []
+        modes = []
+        with _dfa_lock:
+            for dfa in Parser.decisionsToDFA:
+                states, edges = _dfa_size(dfa)
+                decisions.append(DotDict(
+                    decision=dfa.decision,
+                    rule=Parser.ruleNames[dfa.atnStartState.ruleIndex],
+                    states=states, edges=edges,
+                    predictions=0, ATN_Fallback=0, LL_Fallback=0,
+                ))
+            if Lexer is not None:
+                # the lexer ATN simulator only uses the DFAs of the modes' start states
+                for mode, name in enumerate(Lexer.modeNames):
+                    states, edges = _dfa_size(Lexer.decisionsToDFA[mode])
+                    modes.append(DotDict(mode=name, states=states, edges=edges))
+
+        for parser in parsers:
+            interp = parser._interp
+            for info, predictions, ATN_Fallback, LL_Fallback in zip(
+                    decisions, interp.predictions, interp.ATN_Fallback, interp.LL_Fallback):
+                info.predictions += predictions
+                info.ATN_Fallback += ATN_Fallback
+                info.LL_Fallback += LL_Fallback
+        return cls(decisions, modes)
+
+    def totals(self):
+        result = DotDict(decisions=len(self.decisions), states=0, edges=0, predictions=0, ATN_Fallback=0, LL_Fallback=0,
+                         lexer_states=0, lexer_edges=0)
+        for info in self.decisions:
+            for key in ('states', 'edges', 'predictions', 'ATN_Fallback', 'LL_Fallback'):
+                result[key] += info[key]
+        for info in self.modes:
+            result.lexer_states += info.states
+            result.lexer_edges += info.edges
+        return result
+
+    def report(self, key='states', limit=None):
+        """Yields a table of the decisions sorted descending by `key`, then the lexer modes and the totals."""
+
+        rows = sorted((row for row in self.decisions if row.states or row.predictions),
+                      key=lambda row: row[key], reverse=True)
+        yield "decisions"
+        yield (f"{'rule:decision':<32} {'states':>8} {'edges':>8}"
+               f" {'predictions':>12} {'ATN fallbacks':>13} {'LL fallbacks':>12}")
+        for row in rows[:limit]:
+            yield (f"{row.rule + ':' + str(row.decision):<32} {row.states:>8} {row.edges:>8} {row.predictions:>12}"
+                   f" {row.ATN_Fallback:>13} {row.LL_Fallback:>12}")
+        yield ""
+        yield "lexer modes"
+        yield f"{'mode':<32} {'states':>8} {'edges':>8}"
+        for row in self.modes:
+            yield f"{row.mode:<32} {row.states:>8} {row.edges:>8}"
+        yield ""
+        totals = self.totals()
+        yield (f"total: {totals.states} states, {totals.edges} edges in {totals.decisions} decisions;"
+               f" {totals.ATN_Fallback} of {totals.predictions} predictions fell back to ATN simulation,"
+               f" {totals.LL_Fallback} to full context;"
+               f" lexer: {totals.lexer_states} states, {totals.lexer_edges} edges"
+               + (f"; {self.failures} inputs failed to parse" if self.failures else ""))
+
+
+# what `split_items` scans for: strings and comments, which are skipped, and brackets
+_SPLIT_SCAN = re.compile(r'"""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\'|"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\''
+                         r'|//[^\n]*|/\*[\s\S]*?\*/|[()\[\]{}]')
+_OPENING = set('([{')
+_CLOSING = set(')]}')
+# how much text after a closing bracket is lexed to find the token there
+_SPLIT_WINDOW = 4096
+
+
+def _init_parallel_worker(path):
+    # make grammar and visitor modules importable the same way as in the parent, also when workers are spawned
+    for entry in reversed(path):
+        if entry not in sys.path:
+            sys.path.insert(0, entry)
+
+
+def _parse_chunk(args):
+    antlr, item, Visitor, hidden, text, line, column = args
+    lexer = antlr.lexer(InputStream(text), hidden)
+    # tokens, and thus error messages and models, get their positions in the whole input
+    lexer.line, lexer.column = line, column
+    parser = antlr.Parser(CommonTokenStream(lexer))
+    parser.removeErrorListeners()
+    parser.addErrorListener(BailErrorListener.INSTANCE)
+    tokens = parser.getTokenStream()
+    parse_item = getattr(parser, item)
+    visitor = Visitor()
+
+    models = []
+    while tokens.LA(1) != Token.EOF:
+        index = tokens.index
+        models.append(parse_item().accept(visitor))
+        if tokens.index == index:
+            raise ParseCancellationException(f"rule {item} did not consume any input")
+    return models
+
+
+def _try_parse_chunk(args):
+    try:
+        return _parse_chunk(args)
+    except ParseCancellationException:
+        return None
+
+
 class Antlr(object):
     def __init__(self, Lexer=None, Parser=None):
         self.Lexer = Lexer
@@ -121,20 +740,154 @@ class Antlr(object):
     def file_stream(self, file, encoding='ascii', errors='strict'):
         return FileStream(file, encoding, errors)
 
-    def lexer(self, input):
-        lexer = self.Lexer(input)
+    def lexer(self, input, hidden=True):
+        lexer = (self.Lexer if hidden else hidden_free_lexer(self.Lexer))(input)
         lexer.removeErrorListeners()
         return lexer
 
-    def token_stream(self, input):
-        return CommonTokenStream(self.lexer(input))
+    def token_stream(self, input, hidden=True):
+        """Returns a token stream for the input; with `hidden=False`, hidden channel tokens are dropped."""
 
-    def parser(self, input):
-        parser = self.Parser(self.token_stream(input))
+        return CommonTokenStream(self.lexer(input, hidden))
+
+    def parser(self, input, profile=False, hidden=True, count=False):
+        if profile and count:
+            raise ValueError("a parser can either profile or count predictions, not both")
+        parser = self.Parser(self.token_stream(input, hidden))
         parser.removeErrorListeners()
         parser.addErrorListener(BailErrorListener.INSTANCE)
+        if profile:
+            parser._interp = ProfilingATNSimulator(parser)
+        elif count:
+            parser._interp = CountingATNSimulator(parser)
         return parser
 
+    def decision_profile(self, *parsers):
+        return DecisionProfile.of(*parsers)
+
+    def dfa_statistics(self, *parsers):
+        """Returns the shared DFAs' sizes, with the predictions of the given counting parsers."""
+
+        return DFAStatistics.of(self.Lexer, self.Parser, *parsers)
+
+    def warm_up(self, corpus, rule, hidden=True):
+        """Parses a corpus to fill the shared DFA caches, and returns the `DFAStatistics` afterwards."""
+
+        lexer = self.lexer(InputStream(""), hidden)
+        lexer._interp = LockingLexerATNSimulator(lexer)
+        parser = self.Parser(CommonTokenStream(lexer))
+        parser.removeErrorListeners()
+        parser.addErrorListener(BailErrorListener.INSTANCE)
+        parser._interp = CountingATNSimulator(parser)
+        parser.buildParseTrees = False
+        failures = 0
+        for input in corpus:
+            lexer.inputStream = InputStream(input) if isinstance(input, str) else input
+            parser.setTokenStream(CommonTokenStream(lexer))
+            try:
+                getattr(parser, rule)()
+            except ParseCancellationException:
+                failures += 1
+        statistics = self.dfa_statistics(parser)
+        statistics.failures = failures
+        return statistics
+
+    def check(self, input, rule):
+        """Parses the input without building a tree or bailing, and returns the sorted errors."""
+
+        listener = CollectingErrorListener()
+        lexer = self.lexer(input, hidden=False)
+        lexer.addErrorListener(listener)
+        parser = self.Parser(CommonTokenStream(lexer))
+        parser.removeErrorListeners()
+        parser.addErrorListener(listener)
+        parser.buildParseTrees = False
+        getattr(parser, rule)()
+        return sorted(listener.errors)
+
+    def build(self, input, rule, listener, hidden=True):
+        """Parses the input without building a parse tree, and returns the listener's model."""
+
+        parser = self.parser(input, hidden=hidden)
+        parser.buildParseTrees = False
+        parser.addParseListener(listener)
+        getattr(parser, rule)()
+        return listener.model
+
+    def split_items(self, text, item, size):
+        """Returns the (offset, line, column) starts of chunks of about `size` characters of whole items.
+
+        Instead of lexing the whole text, only brackets, strings and comments are scanned for; chunks start at a token
+        that can start an item, after a closing bracket outside of brackets."""
+
+        atn = self.Parser.atn
+        first = atn.nextTokens(atn.ruleToStartState[self.Parser.ruleNames.index(item)])
+        first = {type for interval in first.intervals for type in interval} if first.intervals else set()
+
+        chunks = [(0, 1, 0)]
+        line, counted = 1, 0
+        target = size
+        depth = 0
+        for match in _SPLIT_SCAN.finditer(text):
+            found = match.group()
+            if found in _OPENING:
+                depth += 1
+            elif found in _CLOSING:
+                depth -= 1
+                end = match.end()
+                if depth == 0 and end >= target:
+                    lexer = self.lexer(InputStream(text[end:end + _SPLIT_WINDOW]), hidden=False)
+                    token = lexer.nextToken()
+                    if token.type in first:
+                        offset = end + token.start
+                        line += text.count('\n', counted, offset)
+                        counted = offset
+                        chunks.append((offset, line, offset - text.rfind('\n', 0, offset) - 1))
+                        target = offset + size
+        return chunks
+
+    def parse_parallel(self, text, item, Visitor, jobs=None, chunk_size=None, hidden=True):
+        """Parses a sequence of `item`s in chunks in worker processes, and returns the visited models.
+
+        The Visitor class and the grammar's classes are sent to the workers, so they must be picklable, i.e. defined
+        at the top level of an importable module."""
+
+        jobs = jobs or os.cpu_count() or 1
+        if jobs > 1:
+            try:
+                pickle.dumps((self, Visitor))
+            except (pickle.PicklingError, AttributeError, TypeError) as e:
+                raise TypeError(f"Visitor and grammar classes must be defined at a module's top level: {e}") from None
+        if chunk_size is None:
+            chunk_size = max(len(text) // (jobs * 4), 1)
+        chunks = self.split_items(text, item, chunk_size) if jobs > 1 else [(0, 1, 0)]
+        ends = [offset for offset, _, _ in chunks[1:]] + [len(text)]
+
+        def task(i, end):
+            offset, line, column = chunks[i]
+            return self, item, Visitor, hidden, text[offset:end], line, column
+
+        if len(chunks) == 1:
+            return _parse_chunk(task(0, len(text)))
+
+        models = []
+        workers = min(jobs, len(chunks))
+        with ProcessPoolExecutor(workers, initializer=_init_parallel_worker, initargs=(list(sys.path),)) as executor:
+            results = list(executor.map(_try_parse_chunk, [task(i, end) for i, end in enumerate(ends)]))
+        for i, chunk in enumerate(results):
+            if chunk is None:
+                # the chunk doesn't consist of whole items, because the split was wrong or there's a syntax error:
+                # parse the rest of the text sequentially, which raises the syntax error if there is one
+                models.extend(_parse_chunk(task(i, len(text))))
+                break
+            models.extend(chunk)
+        return models
+
+    def incremental(self, rule, item, visitor, hidden=True):
+        """Returns an `IncrementalParser` for inputs of the start rule `rule`, which is a repetition of `item`s."""
+
+        return IncrementalParser(self, rule, item, visitor, hidden)
+
     def visitor(self, Visitor):
         return dot_dict_visitor(self.Parser, Visitor)
 
@@ -146,3 +899,255 @@ class Antlr(object):
             return parse()
         except ParseCancellationException:
             return None
+
+
+class ParsingService(object):
+    """Parses from any number of threads, with a lexer and parser per thread."""
+
+    def __init__(self, antlr, hidden=True):
+        self.antlr = antlr
+        self.hidden = hidden
+        self._local = threading.local()
+
+    def _recognizers(self):
+        local = self._local
+        try:
+            return local.lexer, local.parser
+        except AttributeError:
+            pass
+
+        lexer = self.antlr.lexer(InputStream(""), self.hidden)
+        lexer._interp = LockingLexerATNSimulator(lexer)
+        parser = self.antlr.Parser(CommonTokenStream(lexer))
+        parser.removeErrorListeners()
+        parser.addErrorListener(BailErrorListener.INSTANCE)
+        parser._interp = LockingParserATNSimulator(parser)
+        local.lexer, local.parser = lexer, parser
+        return lexer, parser
+
+    def parser(self, input):
+        """Returns the current thread's parser, reset to parse the given input."""
+
+        lexer, parser = self._recognizers()
+        lexer.inputStream = input
+        # resetting the parser fails if it has parse listeners
+        parser.removeParseListeners()
+        parser.setTokenStream(CommonTokenStream(lexer))
+        parser.buildParseTrees = True
+        return parser
+
+    def parse(self, input, rule, visitor=None):
+        """Parses the input starting at the named rule, and returns the tree or, with a visitor, its result."""
+
+        tree = getattr(self.parser(input), rule)()
+        return tree if visitor is None else tree.accept(visitor)
+
+    def build(self, input, rule, listener):
+        """Like `Antlr.build`, using the current thread's parser."""
+
+        parser = self.parser(input)
+        parser.buildParseTrees = False
+        parser.addParseListener(listener)
+        try:
+            getattr(parser, rule)()
+        finally:
+            parser.removeParseListeners()
+        return listener.model
+
+
+def _common_prefix(a, b):
+    # binary search, so that the comparisons are done by (fast) string comparisons instead of per character
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix(a, b, limit):
+    lo, hi = 0, min(len(a), len(b), limit)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:len(a) - lo] == b[len(b) - mid:len(b) - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+class IncrementalParser(object):
+    """Parses successive versions of a sequence of items, reusing the unchanged items' models."""
+
+    def __init__(self, antlr, rule, item, visitor, hidden=True):
+        self.antlr = antlr
+        self.rule = rule
+        self.item = item
+        self.visitor = visitor
+        self.hidden = hidden
+        self._Context = getattr(antlr.Parser, f"{item[0].upper()}{item[1:]}Context")
+        self._text = None
+        # (start, stop, digest, model) with character offsets into self._text
+        self._items = []
+        # {digest: [model]} of the previous items that may be reused; each at most once, so that models aren't shared
+        self._models = {}
+        self.parsed = 0
+        self.reused = 0
+
+    def parse(self, text):
+        self.parsed = self.reused = 0
+        items = None
+        if self._text is not None:
+            try:
+                items = self._reparse(text)
+            except ParseCancellationException:
+                self.parsed = self.reused = 0
+        if items is None:
+            self._reusable(self._items)
+            parser = self.antlr.parser(InputStream(text), hidden=self.hidden)
+            tree = getattr(parser, self.rule)()
+            items = [self._visit(ctx, text, 0) for ctx in tree.getTypedRuleContexts(self._Context)]
+
+        self._text = text
+        self._items = items
+        self._models = {}
+        return [model for _, _, _, model in items]
+
+    def _reusable(self, items):
+        self._models = {}
+        for _, _, digest, model in items:
+            self._models.setdefault(digest, []).append(model)
+
+    def _visit(self, ctx, text, offset):
+        start = ctx.start.start + offset
+        stop = ctx.stop.stop + 1 + offset if ctx.stop is not None and ctx.stop.stop >= ctx.start.start else start
+        digest = hashlib.sha1(text[start:stop].encode('utf-8', 'surrogatepass')).digest()
+        models = self._models.get(digest)
+        if models:
+            model = models.pop(0)
+            self.reused += 1
+        else:
+            model = ctx.accept(self.visitor)
+            self.parsed += 1
+        return start, stop, digest, model
+
+    def _reparse(self, text):
+        old = self._text
+        prefix = _common_prefix(old, text)
+        if prefix == len(old) == len(text):
+            self.reused = len(self._items)
+            return self._items
+        suffix = _common_suffix(old, text, min(len(old), len(text)) - prefix)
+        # the changed range is old[prefix:len(old) - suffix]; keep items that don't touch it
+        change_start, change_end = prefix, len(old) - suffix
+        delta = len(text) - len(old)
+        before = [item for item in self._items if item[1] < change_start]
+        after = [item for item in self._items if item[0] > change_end]
+
+        region_start = before[-1][1] if before else 0
+        # kept items after the change start at these offsets into the new text
+        starts = {start + delta - region_start for start, _, _, _ in after}
+
+        errors = CollectingErrorListener()
+        lexer = self.antlr.lexer(InputStream(text[region_start:]), self.hidden)
+        # as in `_parse_chunk`, tokens get their positions in the whole text
+        lexer.line = text.count('\n', 0, region_start) + 1
+        lexer.column = region_start - text.rfind('\n', 0, region_start) - 1
+        lexer.addErrorListener(errors)
+        # lex until a token starts at a kept item in the default mode; from there on, lexing is as before the change
+        region = []
+        while True:
+            default_mode = lexer._mode == lexer.DEFAULT_MODE and not lexer._modeStack
+            token = lexer.nextToken()
+            if token.type == Token.EOF or default_mode and token.start in starts:
+                region_end = token.start + region_start
+                break
+            region.append(token)
+        after = [item for item in after if item[0] + delta >= region_end]
+        kept = {id(item) for item in before + after}
+        self._reusable(item for item in self._items if id(item) not in kept)
+
+        parser = self.antlr.Parser(CommonTokenStream(ListTokenSource(region)))
+        parser.removeErrorListeners()
+        parser.addErrorListener(BailErrorListener.INSTANCE)
+        tokens = parser.getTokenStream()
+        parse_item = getattr(parser, self.item)
+
+        items = []
+        while tokens.LA(1) != Token.EOF:
+            index = tokens.index
+            items.append(self._visit(parse_item(), text, region_start))
+            if tokens.index == index:
+                raise ParseCancellationException(f"rule {self.item} did not consume any input")
+        if errors.errors:
+            # e.g. an unterminated string or comment, which might have extended past the changed text
+            raise ParseCancellationException(str(errors.errors[0]))
+
+        self.reused += len(before) + len(after)
+        return before + items + [(start + delta, stop + delta, digest, model) for start, stop, digest, model in after]
+
+
+def load_grammar(grammar):
+    """Imports the generated lexer and parser for a module path prefix like `tests.grammar.HedgehogTest`."""
+
+    name = grammar.rsplit('.', 1)[-1]
+    Lexer = getattr(importlib.import_module(f'{grammar}Lexer'), f'{name}Lexer')
+    Parser = getattr(importlib.import_module(f'{grammar}Parser'), f'{name}Parser')
+    return Antlr(Lexer, Parser)
+
+
+class GrammarRegistry(object):
+    """Maps grammar names and file extensions to generated modules, which are imported on first use."""
+
+    def __init__(self):
+        self.load_times = {}
+        self._grammars = {}
+        self._extensions = {}
+        self._antlrs = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, grammar, extensions=()):
+        self._grammars[name] = grammar
+        for extension in extensions:
+            if not extension.startswith('.'):
+                extension = f".{extension}"
+            self._extensions[extension] = name
+
+    def names(self):
+        return list(self._grammars)
+
+    def is_loaded(self, name):
+        return name in self._antlrs
+
+    def name_for(self, file):
+        extension = os.path.splitext(file)[1]
+        try:
+            return self._extensions[extension]
+        except KeyError:
+            raise ValueError(f"no grammar registered for extension '{extension}': {file}") from None
+
+    def antlr(self, name):
+        try:
+            return self._antlrs[name]
+        except KeyError:
+            pass
+
+        try:
+            grammar = self._grammars[name]
+        except KeyError:
+            raise ValueError(f"no grammar registered as '{name}'") from None
+
+        with self._lock:
+            if name not in self._antlrs:
+                start = time.perf_counter()
+                self._antlrs[name] = load_grammar(grammar)
+                self.load_times[name] = time.perf_counter() - start
+            return self._antlrs[name]
+
+    def for_file(self, file):
+        return self.antlr(self.name_for(file))
+
+
+grammars = GrammarRegistry()
@@ -0,0 +1,87 @@
+import os.path
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from .antlr import load_grammar
+
+_antlr = None
+_rule = None
+
+
+def _init_worker(grammar, rule, path):
+    global _antlr, _rule
+    # make grammar modules importable the same way as in the parent, also when workers are spawned
+    for entry in reversed(path):
+        if entry not in sys.path:
+            sys.path.insert(0, entry)
+    _antlr = load_grammar(grammar)
+    _rule = rule
+
+
+def _check_file(args):
+    file, encoding = args
+    try:
+        return file, _antlr.check(_antlr.file_stream(file, encoding), _rule)
+    except (OSError, UnicodeDecodeError) as err:
+        return file, [(0, 0, str(err))]
+
+
+def find_files(paths, suffixes):
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if not suffixes or filename.endswith(tuple(suffixes)):
+                        yield os.path.join(dirpath, filename)
+        else:
+            yield path
+
+
+def check_files(grammar, rule, files, encoding='utf-8', jobs=None):
+    """Checks the files for syntax errors in worker processes, and yields (file, errors) pairs in order."""
+
+    files = list(files)
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(files) <= 1:
+        _init_worker(grammar, rule, [])
+        yield from map(_check_file, ((file, encoding) for file in files))
+        return
+
+    with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(grammar, rule, list(sys.path))) as executor:
+        chunksize = max(1, len(files) // (jobs * 4))
+        yield from executor.map(_check_file, ((file, encoding) for file in files), chunksize=chunksize)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check model sources for syntax errors, without building models.")
+    parser.add_argument('paths', metavar='path', nargs='+', help="files, or directories to search for files")
+    parser.add_argument('-g', '--grammar', required=True,
+                        help="module path prefix of the generated lexer and parser, e.g. tests.grammar.HedgehogTest")
+    parser.add_argument('-r', '--rule', required=True, help="the start rule")
+    parser.add_argument('-s', '--suffix', action='append', default=[],
+                        help="in directories, only check files with this suffix; may be repeated")
+    parser.add_argument('-e', '--encoding', default='utf-8')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="number of worker processes, default is the number of CPUs")
+
+    args = parser.parse_args()
+
+    if '' not in sys.path and os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())
+
+    failed = 0
+    for file, errors in check_files(args.grammar, args.rule, find_files(args.paths, args.suffix),
+                                    args.encoding, args.jobs):
+        if errors:
+            failed += 1
+        for line, column, msg in errors:
+            print(f"{file}:{line}:{column}: {msg}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -13,7 +13,55 @@ class G4VisitorVisitor(G4VVisitor):
         return super(G4VisitorVisitor, self).visitAttributeRef(ctx)[1:-1]
 
 
-def generate_code(in_file, out_file=None):
+def static_class_code(name, fields):
+    """Yields the lines of a class with `__slots__` that behaves like `pseudo_tuple(name, fields)`."""
+
+    fieldsStr = ' '.join(f"{field!r}," for field in fields)
+    slotsStr = ' '.join(f"{field!r}," for field in (*fields, '__dict__'))
+    valuesStr = ' '.join(f"self.{field}," for field in fields)
+
+    def format_str(conversion):
+        # like pseudo_tuple: fields first, then other attributes
+        if fields:
+            args = ', '.join(f"{field}={{self.{field}{conversion}}}" for field in fields)
+            return f"""\
+        extra = ''.join(f", {{k}}={{v{conversion}}}" for k, v in self.__dict__.items())
+        return f"{name}({args}{{extra}})\""""
+        else:
+            return f"""\
+        extra = ', '.join(f"{{k}}={{v{conversion}}}" for k, v in self.__dict__.items())
+        return f"{name}({{extra}})\""""
+
+    yield from lines(f"""\
+class {name}(object):
+    __slots__ = ({slotsStr})
+    _fields = ({fieldsStr})
+
+    def __init__(self, *args, **kwargs):
+        if len(args) > {len(fields)}:
+            raise ValueError(f"extra positional args: {{args[{len(fields)}:]}}")
+        for field, arg in zip(self._fields, args):
+            if field in kwargs:
+                raise ValueError(f"argument duplicated in kwargs: {{field}}")
+            kwargs[field] = arg""")
+    for field in fields:
+        yield from lines(f"""\
+        self.{field} = kwargs.pop({field!r}, None)""")
+    yield from lines(f"""\
+        if kwargs:
+            self.__dict__.update(kwargs)
+
+    def __iter__(self):
+        return iter(({valuesStr}))
+
+    def __str__(self):
+{format_str('')}
+
+    def __repr__(self):
+{format_str('!r')}""")
+
+
+def generate_code(in_file, out_file=None, static=False, listener=False, streaming=()):
     antlr = Antlr(G4VisitorLexer, G4VisitorParser)
     p = antlr.parser(FileStream(in_file))
     model = p.visitor().accept(G4VisitorVisitor())
@@ -26,6 +74,13 @@ def generate_code(in_file, out_file=None):
     if out_file is None:
         out_file = os.path.join(dirname, basename + '.py')
 
+    bodies = dict(model.rules)
+    for ruleName in streaming:
+        body = bodies.get(ruleName)
+        # list and dict bodies are lists of items, object bodies and references aren't repeated
+        if not isinstance(body, (RuleExpr, TokenExpr)) or not body.multi or body.presence:
+            raise ValueError(f"Only rules with a repeated rule or token expression can be streamed, not '{ruleName}'.")
+
     @print_to(out_file)
     def code():
         def cap(str):
@@ -34,10 +89,13 @@ def generate_code(in_file, out_file=None):
         def visitor_code(visitor):
             visitorName, grammarName, rules = visitor
 
-            yield from lines(f"""\
+            if not static:
+                yield from lines(f"""\
 from gsl import pseudo_tuple
 
-from gsl.antlr import ParseTreeVisitor
+""")
+            yield from lines(f"""\
+from gsl.antlr import ParseTreeVisitor{", ModelListener" if listener else ""}
 if __name__ is not None and "." in __name__:
     from .{grammarName}Parser import {grammarName}Parser
 else:
@@ -46,41 +104,64 @@ else:
 
 """)
             for ruleName, body in rules:
-                if isinstance(body, ObjectBody):
+                if isinstance(body, ObjectBody) and static:
+                    yield from static_class_code(body.name, [param.name for param in body.params])
+                    yield from lines(f"""\
+
+
+""")
+                elif isinstance(body, ObjectBody):
                     objectName, params = body
                     paramsStr = ' '.join(f"{param.name!r}," for param in params)
                     yield from lines(f"""\
 {objectName} = pseudo_tuple({objectName!r}, ({paramsStr}))""")
 
-            yield from lines(f"""\
+            if not static:
+                yield from lines(f"""\
 
 
+""")
+            yield from lines(f"""\
 class {visitorName}(ParseTreeVisitor):""")
             for ruleName, body in rules:
                 yield from lines(f"""\
     def visit{cap(ruleName)}(self, ctx: {grammarName}Parser.{cap(ruleName)}Context):""")
-                yield from body_code(body)
+                yield from body_code(body, stream_expr_str if ruleName in streaming else None)
                 yield from lines(f"""\
 
 """)
 
-        def body_code(body):
+            if listener:
+                yield from lines(f"""\
+
+class {grammarName}ModelListener(ModelListener):""")
+                for ruleName, body in rules:
+                    yield from lines(f"""\
+    def build{cap(ruleName)}(self, ctx: {grammarName}Parser.{cap(ruleName)}Context, children):""")
+                    yield from body_code(body, listener_expr_str)
+                    yield from lines(f"""\
+
+""")
+
+        def body_code(body, expr_str=None):
+            if expr_str is None:
+                expr_str = visitor_expr_str
             if isinstance(body, ObjectBody):
-                yield from object_body_code(body)
+                yield from object_body_code(body, expr_str)
             else:
-                yield from expr_body_code(body)
+                yield from expr_body_code(body, expr_str)
 
-        def object_body_code(objectBody):
+        def object_body_code(objectBody, expr_str):
             yield from lines(f"""\
         return {objectBody.name}(""")
             for paramName, expr, optional in objectBody.params:
-                opt = f" if {expr_core_str(expr, True)} else None" if optional else ""
+                opt = f" if {expr_str(expr, True)} else None" if optional else ""
                 yield from lines(f"""\
             {expr_str(expr)}{opt},""")
             yield from lines(f"""\
         )""")
 
-        def expr_body_code(exprBody):
+        def expr_body_code(exprBody, expr_str):
             yield from lines(f"""\
         return {expr_str(exprBody)}""")
 
@@ -94,11 +175,35 @@ class {visitorName}(ParseTreeVisitor):""")
             elif isinstance(expr, RefExpr):
                 return f"ctx.{expr.ref}"
 
-        def expr_str(expr):
+        def visitor_expr_str(expr, check=False, stream=False):
+            if check:
+                return expr_core_str(expr, True)
             core = expr_core_str(expr)
-            operation = "bool" if expr.presence else "self.visitNode" if isinstance(expr, RefExpr) or not expr.multi else "self.visitNodes"
+            if expr.presence:
+                operation = "bool"
+            elif isinstance(expr, RefExpr) or not expr.multi:
+                operation = "self.visitNode"
+            else:
+                operation = "self.streamNodes" if stream else "self.visitNodes"
             return f"{operation}({core})"
 
+        def stream_expr_str(expr, check=False):
+            # yields the models one at a time, see ParseTreeVisitor.streamNodes
+            return visitor_expr_str(expr, check, stream=True)
+
+        def listener_expr_str(expr, check=False):
+            # like visitor_expr_str, but using the models in `children` that the listener already built
+            presence = check or expr.presence
+            if isinstance(expr, RuleExpr):
+                args = "children" + ''.join(f", {model.grammar}Parser.{cap(t)}Context" for t in expr.rules)
+                operation = "self.has_children" if presence else "self.get_models" if expr.multi else "self.get_model"
+                return f"{operation}({args})"
+            elif isinstance(expr, TokenExpr):
+                operation = "self.has_token" if presence else "self.get_tokens" if expr.multi else "self.get_token"
+                return f"{operation}(children, {model.grammar}Parser.{expr.token})"
+            elif isinstance(expr, RefExpr):
+                return f"bool(ctx.{expr.ref})" if presence else f"self.get_ref(children, ctx.{expr.ref})"
+
         yield from visitor_code(model)
 
 
@@ -109,6 +214,13 @@ def main():
     parser.add_argument('in_files', metavar='in_file', nargs='+')
     parser.add_argument('-o', '--out_file', default=None,
                         help="if there is only one input file, use this as the output file")
+    parser.add_argument('--static', action='store_true',
+                        help="emit statically defined model classes with __slots__ instead of pseudo_tuple calls")
+    parser.add_argument('--listener', action='store_true',
+                        help="also emit a ModelListener that builds the models while parsing, without a parse tree")
+    parser.add_argument('--streaming', action='append', default=[], metavar='RULE',
+                        help="make the visitor method of this rule, e.g. a start rule like `expr = message*;`,"
+                             " return a generator of models instead of a list; may be repeated")
 
     args = parser.parse_args()
 
@@ -116,7 +228,7 @@ def main():
         print("explicit out_file only allowed for a single in_file")
 
     for in_file in args.in_files:
-        generate_code(in_file, args.out_file)
+        generate_code(in_file, args.out_file, args.static, args.listener, args.streaming)
 
 
 if __name__ == '__main__':
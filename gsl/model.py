@@ -0,0 +1,413 @@
+"""Utilities for working with models made of pseudo tuples, `DotDict`s, lists and dicts."""
+
+from .dot_dict import DotDict
+
+_NODE = 1
+_STATIC_NODE = 2
+_CONTAINER = 3
+_MISSING = object()
+
+
+def _kind(cls):
+    if issubclass(cls, DotDict):
+        return _NODE
+    if getattr(cls, '_fields', None) is not None:
+        # pseudo tuples keep their fields in `__dict__`, static model classes generated by g4v in slots
+        return _STATIC_NODE if hasattr(cls, '__slots__') else _NODE
+    if issubclass(cls, (list, tuple, dict)):
+        return _CONTAINER
+    return None
+
+
+def _items(node, kind):
+    if isinstance(node, dict):
+        return node.values()
+    if kind == _STATIC_NODE:
+        return [getattr(node, field) for field in type(node)._fields]
+    return node.__dict__.values()
+
+
+def _get(node, attr, default=None):
+    if isinstance(node, dict):
+        return node.get(attr, default)
+    return getattr(node, attr, default)
+
+
+class ModelIndex(object):
+    """Indexes the nodes of a model by type, attribute value and parent, in model order."""
+
+    def __init__(self, model):
+        self.nodes = []
+        self._positions = {}
+        self._parents = {}
+        self._types = {}
+        self._values = {}
+
+        positions = self._positions
+        parents = self._parents
+        nodes = self.nodes
+        types = self._types
+        kinds = {}
+
+        def kind_of(value):
+            cls = type(value)
+            try:
+                return kinds[cls]
+            except KeyError:
+                result = kinds[cls] = _kind(cls)
+                return result
+
+        # only nodes and containers are put on the stack, leaf values are skipped right away
+        stack = [(model, None)] if kind_of(model) else []
+        while stack:
+            value, parent = stack.pop()
+            kind = kinds[type(value)]
+            if kind != _CONTAINER:
+                if id(value) in positions:
+                    continue
+                positions[id(value)] = len(nodes)
+                parents[id(value)] = parent
+                nodes.append(value)
+                types.setdefault(type(value), []).append(value)
+                children = _items(value, kind)
+                parent = value
+            else:
+                children = value.values() if isinstance(value, dict) else value
+
+            stack.extend([(child, parent) for child in reversed(list(children)) if kind_of(child)])
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, node):
+        return id(node) in self._positions
+
+    def of_type(self, *types):
+        """Returns the nodes that are instances of any of the given types."""
+
+        classes = [cls for cls in self._types if issubclass(cls, types)]
+        if len(classes) == 1:
+            return list(self._types[classes[0]])
+        result = [node for cls in classes for node in self._types[cls]]
+        result.sort(key=lambda node: self._positions[id(node)])
+        return result
+
+    def _lookup(self, types, attr):
+        # returns {value: nodes} for hashable values, and the nodes with unhashable values, e.g. lists
+        key = (types, attr)
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+
+        values = {}
+        unhashable = []
+        for node in self.of_type(*types) if types else self.nodes:
+            value = _get(node, attr, _MISSING)
+            if value is _MISSING:
+                continue
+            try:
+                values.setdefault(value, []).append(node)
+            except TypeError:
+                unhashable.append(node)
+        result = self._values[key] = values, unhashable
+        return result
+
+    def find(self, *types, **attrs):
+        """Returns the nodes of the given types (or any) whose attributes have the given values."""
+
+        if not attrs:
+            return self.of_type(*types) if types else list(self.nodes)
+
+        (attr, value), *rest = attrs.items()
+        values, unhashable = self._lookup(types, attr)
+        try:
+            nodes = values.get(value, ())
+        except TypeError:
+            # an unhashable value can't be looked up, compare it to all nodes' attributes
+            nodes = [node for node in (self.of_type(*types) if types else self.nodes)
+                     if _get(node, attr, _MISSING) == value]
+        else:
+            matches = [node for node in unhashable if _get(node, attr) == value]
+            if matches:
+                nodes = sorted([*nodes, *matches], key=lambda node: self._positions[id(node)])
+        return [node for node in nodes if all(_get(node, k, _MISSING) == v for k, v in rest)]
+
+    def get(self, *types, **attrs):
+        """Like `find`, but returns only the first matching node, or `None`."""
+
+        nodes = self.find(*types, **attrs)
+        return nodes[0] if nodes else None
+
+    def parent(self, node):
+        """Returns the node containing the given node, or `None` for the root."""
+
+        try:
+            return self._parents[id(node)]
+        except KeyError:
+            raise ValueError("node is not part of the indexed model") from None
+
+    def ancestors(self, node):
+        """Yields the given node's parent, grandparent, etc."""
+
+        node = self.parent(node)
+        while node is not None:
+            yield node
+            node = self._parents[id(node)]
+
+    def ancestor(self, node, *types):
+        """Returns the closest ancestor that is an instance of any of the given types, or `None`."""
+
+        for ancestor in self.ancestors(node):
+            if isinstance(ancestor, types):
+                return ancestor
+        return None
+
+
+def _encode(values, np):
+    # returns (array, dictionary); dictionary is the list of distinct strings for dictionary encoded columns, else None
+    types = {type(value) for value in values}
+    if types and types <= {str, type(None)}:
+        dictionary = []
+        codes = {None: -1}
+        for value in values:
+            if value not in codes:
+                codes[value] = len(dictionary)
+                dictionary.append(value)
+        return np.fromiter((codes[value] for value in values), dtype=np.int32, count=len(values)), dictionary
+    if types == {bool}:
+        return np.array(values, dtype=np.bool_), None
+    if types == {int}:
+        try:
+            return np.array(values, dtype=np.int64), None
+        except OverflowError:
+            pass
+    elif types and types <= {int, float}:
+        return np.array(values, dtype=np.float64), None
+
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array, None
+
+
+class _Row(object):
+    """A view of one row of a `ModelTable`; it behaves like, and passes `isinstance` checks for, the table's class."""
+
+    __slots__ = ('_table', '_index')
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+
+    @property
+    def __class__(self):
+        return self._table.cls
+
+    def __getattr__(self, name):
+        try:
+            return self._table._value(name, self._index)
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __iter__(self):
+        return (self._table._value(field, self._index) for field in self._table.fields)
+
+    def __str__(self):
+        args = ', '.join(f"{field}={value}" for field, value in zip(self._table.fields, self))
+        return f"{self._table.cls.__name__}({args})"
+
+    def __repr__(self):
+        args = ', '.join(f"{field}={value!r}" for field, value in zip(self._table.fields, self))
+        return f"{self._table.cls.__name__}({args})"
+
+
+def _decode(ids, decoders, np):
+    # returns one column of values per field for the ids, see `ModelTable._groups`
+    columns = []
+    remainder = ids
+    for values, width in reversed(decoders):
+        remainder, codes = np.divmod(remainder, len(values))
+        column = [values[code] for code in codes.tolist()]
+        if width is None:
+            columns.append(column)
+        else:
+            columns.extend([combination[i] for combination in column] for i in reversed(range(width)))
+    columns.reverse()
+    return columns
+
+
+class ModelTable(object):
+    """Stores many nodes of one pseudo tuple class as NumPy columns. Requires NumPy."""
+
+    def __init__(self, cls, rows=()):
+        import numpy as np
+
+        self.cls = cls
+        self.fields = cls._fields
+        columns = [[] for _ in self.fields]
+        for row in rows:
+            for column, value in zip(columns, row):
+                column.append(value)
+        self._columns = {}
+        self._dictionaries = {}
+        for field, values in zip(self.fields, columns):
+            self._columns[field], self._dictionaries[field] = _encode(values, np)
+        self._codes = {field: {value: code for code, value in enumerate(dictionary)}
+                       for field, dictionary in self._dictionaries.items() if dictionary is not None}
+
+    def _derive(self, columns):
+        table = ModelTable.__new__(ModelTable)
+        table.cls = self.cls
+        table.fields = self.fields
+        table._columns = columns
+        table._dictionaries = self._dictionaries
+        table._codes = self._codes
+        return table
+
+    def __len__(self):
+        return len(self._columns[self.fields[0]]) if self.fields else 0
+
+    def __getitem__(self, index):
+        if isinstance(index, int):
+            length = len(self)
+            if not -length <= index < length:
+                raise IndexError("table index out of range")
+            return _Row(self, index % length)
+        return self.take(index)
+
+    def __iter__(self):
+        return (_Row(self, index) for index in range(len(self)))
+
+    def _value(self, field, index):
+        import numpy as np
+
+        value = self._columns[field][index]
+        dictionary = self._dictionaries[field]
+        if dictionary is not None:
+            return dictionary[value] if value >= 0 else None
+        return value.item() if isinstance(value, np.generic) else value
+
+    def column(self, field):
+        """Returns the field's NumPy array; for dictionary encoded columns, these are the codes."""
+
+        return self._columns[field]
+
+    def dictionary(self, field):
+        """Returns the list of distinct strings of a dictionary encoded column, or `None`."""
+
+        return self._dictionaries[field]
+
+    def values(self, field):
+        """Returns the field's values as a list."""
+
+        dictionary = self._dictionaries[field]
+        if dictionary is not None:
+            return [dictionary[code] if code >= 0 else None for code in self._columns[field].tolist()]
+        return self._columns[field].tolist()
+
+    def take(self, indices):
+        """Returns a table of the rows selected by a slice, an array of indices or a boolean mask."""
+
+        return self._derive({field: column[indices] for field, column in self._columns.items()})
+
+    def mask(self, **values):
+        """Returns a boolean array of the rows where each field has the given value, or one of the given values."""
+
+        import numpy as np
+
+        result = np.ones(len(self), dtype=np.bool_)
+        for field, value in values.items():
+            column = self._columns[field]
+            options = list(value) if isinstance(value, (list, tuple, set, frozenset)) else [value]
+            codes = self._codes.get(field)
+            if codes is not None:
+                options = [-1 if option is None else codes[option]
+                           for option in options if option is None or option in codes]
+            if len(options) == 1:
+                result &= column == options[0]
+            else:
+                result &= np.isin(column, options)
+        return result
+
+    def filter(self, mask=None, **values):
+        """Returns a table of the rows where `mask` (a boolean array) is true and the fields have the given values."""
+
+        if values:
+            mask = self.mask(**values) if mask is None else mask & self.mask(**values)
+        return self if mask is None else self.take(mask)
+
+    def _dense(self, field, np):
+        # returns codes from 0 to n - 1 for the column's distinct values, and the list of these values
+        column = self._columns[field]
+        dictionary = self._dictionaries[field]
+        if dictionary is not None:
+            return column.astype(np.int64) + 1, [None] + dictionary
+        if column.dtype == object:
+            codes = {}
+            dense = np.fromiter((codes.setdefault(value, len(codes)) for value in column),
+                                dtype=np.int64, count=len(column))
+            return dense, list(codes)
+        values, dense = np.unique(column, return_inverse=True)
+        return dense.reshape(-1).astype(np.int64), values.tolist()
+
+    def _groups(self, fields):
+        # returns the groups' keys, sizes and ids in order of their first rows, and each row's group id
+        import numpy as np
+
+        length = len(self)
+        ids = np.zeros(length, dtype=np.int64)
+        size = 1
+        # each digit of the ids decodes to the values of one field, or (width) to tuples of values of several fields
+        decoders = []
+        for field in fields:
+            dense, values = self._dense(field, np)
+            if size * len(values) >= 2 ** 62:
+                # too many combinations for int64 ids: make the combinations seen so far a single digit
+                combinations, ids = np.unique(ids, return_inverse=True)
+                ids = ids.reshape(-1).astype(np.int64)
+                width = sum(width or 1 for _, width in decoders)
+                decoders = [(list(zip(*_decode(combinations, decoders, np))), width)]
+                size = len(combinations)
+            ids = ids * len(values) + dense
+            size *= len(values)
+            decoders.append((values, None))
+
+        if size <= 2 * length + 1024:
+            counts = np.bincount(ids, minlength=size)
+            groups = np.flatnonzero(counts)
+            first = np.full(size, length, dtype=np.int64)
+            np.minimum.at(first, ids, np.arange(length))
+            first, counts = first[groups], counts[groups]
+        else:
+            groups, first, counts = np.unique(ids, return_index=True, return_counts=True)
+        order = np.argsort(first, kind='stable')
+        groups, counts = groups[order], counts[order]
+
+        columns = _decode(groups, decoders, np)
+        keys = columns[0] if len(fields) == 1 else list(zip(*columns))
+
+        return keys, counts, groups, ids
+
+    def group_by(self, *fields):
+        """Returns a dict from the fields' distinct values to tables of their rows, in order of their first row."""
+
+        import numpy as np
+
+        keys, counts, groups, ids = self._groups(fields)
+        # number the rows' groups in order, and sort the rows by that
+        sorter = np.argsort(groups)
+        order = np.argsort(sorter[np.searchsorted(groups, ids, sorter=sorter)], kind='stable')
+        parts = np.split(order, np.cumsum(counts)[:-1]) if len(counts) else []
+        return {key: self.take(part) for key, part in zip(keys, parts)}
+
+    def count_by(self, *fields):
+        """Like `group_by`, but returns the number of rows per group."""
+
+        keys, counts, _, _ = self._groups(fields)
+        return dict(zip(keys, counts.tolist()))
+
+    def nodes(self):
+        """Returns a list of new instances of the table's class for its rows."""
+
+        columns = [self.values(field) for field in self.fields]
+        return [self.cls(*values) for values in zip(*columns)]
@@ -0,0 +1,283 @@
+from contextlib import contextmanager
+import json
+import os
+import sys
+import threading
+import time
+
+from . import _instrumentation
+from .dot_dict import DotDict
+
+
+def _function_name(fn):
+    code = getattr(fn, '__code__', None) or getattr(fn, 'gi_code', None)
+    if code is None:
+        return type(fn).__qualname__
+    return getattr(code, 'co_qualname', code.co_name)
+
+
+def _file_name(file):
+    if file is None:
+        return '<stdout>'
+    if isinstance(file, (str, bytes, os.PathLike)):
+        return os.fsdecode(file)
+    return str(getattr(file, 'name', file))
+
+
+class Output(DotDict):
+    def count(self, lines, end, file):
+        encoding = getattr(file, 'encoding', None) or 'utf-8'
+        for line in lines:
+            self.lines += 1
+            self.bytes += len(f"{line}{end}".encode(encoding, 'replace'))
+            yield line
+
+
+class _ThreadState(threading.local):
+    # a profiler can be entered in several threads, each with its own nesting of outputs
+    def __init__(self):
+        self.stack = []
+        self.previous = None
+
+
+class Profiler(object):
+    """Records what code generation in the current thread writes, and how long it takes."""
+
+    def __init__(self):
+        self.outputs = []
+        self.fragments = {}
+        self._epoch = None
+        self._local = _ThreadState()
+
+    def __enter__(self):
+        if self._epoch is None:
+            self._epoch = time.perf_counter()
+        self._local.previous = _instrumentation.profiler
+        _instrumentation.profiler = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _instrumentation.profiler = self._local.previous
+        self._local.previous = None
+
+    @contextmanager
+    def output(self, file, fn, kind):
+        # generate writes through print_to, and print_to through printlines: record only the outermost of these
+        stack = self._local.stack
+        if stack and (kind == 'printlines' or stack[-1].kind == 'generate' and kind == 'print_to'):
+            yield stack[-1]
+            return
+
+        output = Output(
+            file=_file_name(file), function=_function_name(fn), kind=kind,
+            start=time.perf_counter() - self._epoch, duration=None,
+            lines=0, bytes=0, sections=DotDict(), fragments={},
+            thread=threading.get_ident(),
+        )
+        self.outputs.append(output)
+        stack.append(output)
+        try:
+            yield output
+        finally:
+            stack.pop()
+            output.duration = time.perf_counter() - self._epoch - output.start
+
+    def fragment(self, name, lines):
+        stack = self._local.stack
+        fragments = stack[-1].fragments if stack else self.fragments
+        try:
+            fragment = fragments[name]
+        except KeyError:
+            fragment = fragments[name] = DotDict(calls=0, lines=0, bytes=0)
+        fragment.calls += 1
+        for line in lines:
+            fragment.lines += 1
+            fragment.bytes += len(line.encode('utf-8', 'replace')) + 1
+            yield line
+
+    def functions(self):
+        """Aggregates the outputs per generator function."""
+
+        result = {}
+        for output in self.outputs:
+            try:
+                function = result[output.function]
+            except KeyError:
+                function = result[output.function] = DotDict(outputs=0, duration=0.0, lines=0, bytes=0)
+            function.outputs += 1
+            function.duration += output.duration or 0.0
+            function.lines += output.lines
+            function.bytes += output.bytes
+        return result
+
+    def to_json(self):
+        return {
+            'outputs': self.outputs,
+            'functions': self.functions(),
+            'fragments': self.fragments,
+        }
+
+    def to_trace(self):
+        pid = os.getpid()
+        events = []
+        for output in self.outputs:
+            events.append({
+                'name': output.file,
+                'cat': output.kind,
+                'ph': 'X',
+                'ts': output.start * 1e6,
+                'dur': (output.duration or 0.0) * 1e6,
+                'pid': pid,
+                'tid': output.thread,
+                'args': {
+                    'function': output.function,
+                    'lines': output.lines,
+                    'bytes': output.bytes,
+                    'sections': output.sections,
+                    'fragments': output.fragments,
+                },
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def dump_json(self, file):
+        with open(file, 'w') as f:
+            json.dump(self.to_json(), f, indent=2)
+
+    def dump_trace(self, file):
+        with open(file, 'w') as f:
+            json.dump(self.to_trace(), f)
+
+
+class MemoryReport(object):
+    """How much memory a model uses, by node class and field, and what duplicate strings take."""
+
+    ROOT = '(root)'
+
+    def __init__(self, model):
+        from .model import _kind, _NODE, _STATIC_NODE
+
+        self.classes = {}
+        self.fields = {}
+        self.strings = DotDict(count=0, distinct=0, duplicates=0, duplicate_size=0)
+        self.total = 0
+        self.traced = None
+        self.peak = None
+
+        seen = set()
+        strings = set()
+        kinds = {}
+
+        def entry(table, name):
+            try:
+                return table[name]
+            except KeyError:
+                result = table[name] = DotDict(count=0, size=0)
+                return result
+
+        # (value, class entry, field entry); values are counted for the entries of the node they are found under
+        root = entry(self.classes, self.ROOT)
+        stack = [(model, root, None)]
+        while stack:
+            value, cls, field = stack.pop()
+            if id(value) in seen:
+                continue
+            seen.add(id(value))
+
+            size = sys.getsizeof(value)
+            t = type(value)
+            try:
+                kind = kinds[t]
+            except KeyError:
+                kind = kinds[t] = _kind(t)
+
+            if kind == _NODE or kind == _STATIC_NODE:
+                name = t.__name__
+                cls = entry(self.classes, name)
+                cls.count += 1
+                if isinstance(value, dict):
+                    items = list(value.items())
+                else:
+                    items = [(attr, getattr(value, attr)) for attr in t._fields] if kind == _STATIC_NODE else []
+                    attrs = getattr(value, '__dict__', None)
+                    if attrs is not None:
+                        size += sys.getsizeof(attrs)
+                        items += [item for item in attrs.items() if kind == _NODE or item[0] not in t._fields]
+                children = []
+                for attr, child in items:
+                    child_field = entry(self.fields, f"{name}.{attr}")
+                    child_field.count += 1
+                    children.append((child, cls, child_field))
+                stack.extend(reversed(children))
+            else:
+                if field is not None:
+                    field.size += size
+                if isinstance(value, dict):
+                    stack.extend((child, cls, field) for item in reversed(value.items()) for child in reversed(item))
+                elif isinstance(value, (list, tuple)):
+                    stack.extend((child, cls, field) for child in reversed(value))
+                elif isinstance(value, str):
+                    self.strings.count += 1
+                    if value in strings:
+                        self.strings.duplicates += 1
+                        self.strings.duplicate_size += size
+                    else:
+                        strings.add(value)
+            cls.size += size
+            self.total += size
+        self.strings.distinct = len(strings)
+
+    @classmethod
+    def measure(cls, load, *args, **kwargs):
+        """Calls `load` while tracing allocations, and returns the report of its result."""
+
+        import gc
+        import tracemalloc
+
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        try:
+            gc.collect()
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            model = load(*args, **kwargs)
+            gc.collect()
+            after, peak = tracemalloc.get_traced_memory()
+        finally:
+            if started:
+                tracemalloc.stop()
+
+        report = cls(model)
+        report.traced = after - before
+        report.peak = peak - before
+        return report
+
+    def to_json(self):
+        return {
+            'total': self.total,
+            'traced': self.traced,
+            'peak': self.peak,
+            'classes': self.classes,
+            'fields': self.fields,
+            'strings': self.strings,
+        }
+
+    def report(self, limit=None):
+        """Yields a table of the classes and of the fields, sorted descending by size, followed by the totals."""
+
+        def table(head, rows):
+            yield f"{head:<40} {'count':>10} {'bytes':>12} {'share':>6}"
+            for name, row in sorted(rows.items(), key=lambda item: item[1].size, reverse=True)[:limit]:
+                share = row.size / self.total if self.total else 0
+                yield f"{name:<40} {row.count:>10} {row.size:>12} {share:>6.1%}"
+
+        yield from table("class", self.classes)
+        yield ""
+        yield from table("field", self.fields)
+        yield ""
+        strings = self.strings
+        yield (f"strings: {strings.count} ({strings.distinct} distinct),"
+               f" {strings.duplicates} duplicates using {strings.duplicate_size} bytes")
+        yield f"total: {self.total} bytes"
+        if self.traced is not None:
+            yield f"traced: {self.traced} bytes retained, {self.peak} bytes peak"
@@ -0,0 +1,364 @@
+"""Opt-in tracking of what a generator reads from its models, to regenerate only outputs whose reads changed.
+
+Reads that don't go through the tracked arguments, e.g. of models captured from the enclosing scope, are not seen;
+generator functions should take everything they use from the model as arguments.
+Besides the generator function's own code, that of the functions it references by global name or closure
+(e.g. helpers, templates and fragments) is tracked, recursively, but not that of classes or other modules' contents.
+The proxies pass `isinstance` checks for the wrapped classes, but are not instances of them otherwise."""
+
+import hashlib
+import json
+import os
+
+from . import generate
+from .dot_dict import DotDict
+
+# special steps are tuples, so that they can't be confused with keys; in JSON, they are lists
+_LEN = ('#len',)
+_KEYS = ('#keys',)
+_REPR = ('#repr',)
+_STR = ('#str',)
+
+_MISSING = object()
+
+_SCALARS = (str, int, float, bool, type(None))
+
+
+def _digest(value):
+    # tagged, so that e.g. True and 1, or a type name and a str, have different digests
+    if value is _MISSING:
+        return ['m']
+    if isinstance(value, _SCALARS):
+        return ['v', type(value).__name__, value]
+    if isinstance(value, (dict, list, tuple)) or hasattr(type(value), '_fields'):
+        # containers and nodes are tracked, so only their type is read here
+        return ['t', type(value).__qualname__]
+    if isinstance(value, (set, frozenset)):
+        value = sorted(value, key=repr)
+    return ['r', type(value).__qualname__, hashlib.sha1(repr(value).encode()).hexdigest()]
+
+
+def _step(value, step):
+    if isinstance(step, (list, tuple)) and len(step) == 1:
+        step, = step
+        if step == _LEN[0]:
+            return len(value)
+        if step == _KEYS[0]:
+            return repr(list(value))
+        if step == _REPR[0]:
+            return repr(value)
+        if step == _STR[0]:
+            return str(value)
+        step = (step,)
+    if isinstance(value, (dict, list, tuple)) and not hasattr(type(value), '_fields'):
+        return value[step]
+    return getattr(value, step)
+
+
+def replay(models, path):
+    """Returns the digest of what `path` reads from the given {argument: model} dict, as recorded by `track`."""
+
+    value = models
+    try:
+        for step in path:
+            value = _step(value, step)
+    except (LookupError, AttributeError, TypeError):
+        value = _MISSING
+    return _digest(value)
+
+
+def track(value, reads, path=()):
+    """Records reading `value` at `path` in `reads`, and returns it, wrapped if it is a container."""
+
+    reads[path] = _digest(value)
+    if isinstance(value, DotDict):
+        return _DotDictProxy(value, reads, path)
+    if isinstance(value, dict):
+        return _DictProxy(value, reads, path)
+    if hasattr(type(value), '_fields'):
+        return _NodeProxy(value, reads, path)
+    if isinstance(value, (list, tuple)):
+        return _ListProxy(value, reads, path)
+    return value
+
+
+def _unwrap(value):
+    return value._value if isinstance(value, _Proxy) else value
+
+
+class _Proxy(object):
+    __slots__ = ('_value', '_reads', '_path')
+
+    def __init__(self, value, reads, path):
+        object.__setattr__(self, '_value', value)
+        object.__setattr__(self, '_reads', reads)
+        object.__setattr__(self, '_path', path)
+
+    @property
+    def __class__(self):
+        return type(self._value)
+
+    def _record(self, step, value):
+        self._reads[self._path + (step,)] = _digest(value)
+        return value
+
+    def _track(self, step, value):
+        return track(value, self._reads, self._path + (step,))
+
+    def _whole(self):
+        # operations that depend on the whole value, e.g. comparisons, read its repr
+        self._record(_REPR, repr(self._value))
+        return self._value
+
+    def __eq__(self, other):
+        return self._whole() == _unwrap(other)
+
+    def __ne__(self, other):
+        return self._whole() != _unwrap(other)
+
+    def __hash__(self):
+        return hash(self._whole())
+
+    def __repr__(self):
+        return self._record(_REPR, repr(self._value))
+
+    def __str__(self):
+        return self._record(_STR, str(self._value))
+
+    def __format__(self, format_spec):
+        return format(str(self), format_spec)
+
+
+class _NodeProxy(_Proxy):
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        return self._track(name, getattr(self._value, name))
+
+    def __setattr__(self, name, value):
+        setattr(self._value, name, _unwrap(value))
+
+    def __iter__(self):
+        for field in type(self._value)._fields:
+            yield self._track(field, getattr(self._value, field))
+
+
+class _DictProxy(_Proxy):
+    __slots__ = ()
+
+    def __setitem__(self, key, value):
+        self._value[key] = _unwrap(value)
+
+    def __getitem__(self, key):
+        try:
+            value = self._value[key]
+        except KeyError:
+            self._record(key, _MISSING)
+            raise
+        return self._track(key, value)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        if key not in self._value:
+            self._record(key, _MISSING)
+            return False
+        self._track(key, self._value[key])
+        return True
+
+    def __len__(self):
+        return self._record(_LEN, len(self._value))
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        keys = list(self._value)
+        self._record(_KEYS, repr(keys))
+        return keys
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+
+class _DotDictProxy(_DictProxy):
+    __slots__ = ()
+
+    def __getattribute__(self, name):
+        # like `DotDict`, keys take precedence over methods
+        if not name.startswith('_') and name in object.__getattribute__(self, '_value'):
+            return self[name]
+        return object.__getattribute__(self, name)
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        self._value[name] = _unwrap(value)
+
+
+class _ListProxy(_Proxy):
+    __slots__ = ()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self._track(index, self._value[index])
+
+    def __len__(self):
+        return self._record(_LEN, len(self._value))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._track(i, self._value[i])
+
+    def __reversed__(self):
+        for i in reversed(range(len(self))):
+            yield self._track(i, self._value[i])
+
+    def __contains__(self, item):
+        return any(element == item for element in self)
+
+    def index(self, item):
+        for i, element in enumerate(self):
+            if element == item:
+                return i
+        raise ValueError(f"{item!r} is not in list")
+
+    def count(self, item):
+        return sum(1 for element in self if element == item)
+
+    def __add__(self, other):
+        return self._whole() + _unwrap(other)
+
+    def __radd__(self, other):
+        return _unwrap(other) + self._whole()
+
+    def __mul__(self, n):
+        return self._whole() * n
+
+    def __rmul__(self, n):
+        return n * self._whole()
+
+    def __lt__(self, other):
+        return self._whole() < _unwrap(other)
+
+    def __le__(self, other):
+        return self._whole() <= _unwrap(other)
+
+    def __gt__(self, other):
+        return self._whole() > _unwrap(other)
+
+    def __ge__(self, other):
+        return self._whole() >= _unwrap(other)
+
+
+def _functions(value):
+    # the functions a global or closure variable refers to, e.g. the one wrapped by a `fragment`
+    while value is not None:
+        if hasattr(value, '__code__'):
+            yield value
+        value = getattr(value, '__wrapped__', None)
+
+
+def _code_digest(fn):
+    hash = hashlib.sha1()
+    seen = set()
+
+    def update(code, globals):
+        hash.update(code.co_code)
+        hash.update(repr(code.co_names).encode())
+        for name in code.co_names:
+            for function in _functions(globals.get(name)):
+                update_function(function)
+        for const in code.co_consts:
+            if hasattr(const, 'co_code'):
+                update(const, globals)
+            else:
+                hash.update(repr(const).encode())
+
+    def update_function(fn):
+        if id(fn) in seen:
+            return
+        seen.add(id(fn))
+        update(fn.__code__, fn.__globals__)
+        for cell in fn.__closure__ or ():
+            try:
+                contents = cell.cell_contents
+            except ValueError:
+                # an empty cell
+                continue
+            for function in _functions(contents):
+                update_function(function)
+
+    for function in _functions(fn):
+        update_function(function)
+    return hash.hexdigest()
+
+
+class Dependencies(object):
+    """The recorded reads of generated outputs, saved to a JSON file when used as a context manager."""
+
+    def __init__(self, file):
+        self.file = file
+        try:
+            with open(file) as f:
+                self.outputs = json.load(f)
+        except FileNotFoundError:
+            self.outputs = {}
+        self.generated = []
+        self.skipped = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.save()
+
+    def save(self):
+        with open(self.file, 'w') as f:
+            json.dump(self.outputs, f)
+
+    def is_current(self, file, fn, models):
+        """Whether `file` exists and was generated by `fn`, reading only things that are the same in `models`."""
+
+        try:
+            entry = self.outputs[os.fsdecode(file)]
+        except KeyError:
+            return False
+        if entry['code'] != _code_digest(fn) or not os.path.exists(file):
+            return False
+        return all(replay(models, path) == digest for path, digest in entry['reads'])
+
+    def generate(self, file, streaming=False, **models):
+        """Like `generate`, but only runs if the output is not current, with the models tracked."""
+
+        def decorator(fn):
+            key = os.fsdecode(file)
+            if self.is_current(file, fn, models):
+                self.skipped.append(key)
+                return
+
+            reads = {}
+            tracked = {name: track(model, reads, (name,)) for name, model in models.items()}
+
+            @generate(file, streaming=streaming)
+            def code():
+                yield from fn(**tracked)
+
+            self.outputs[key] = {
+                'code': _code_digest(fn),
+                'reads': [[list(path), digest] for path, digest in reads.items()],
+            }
+            self.generated.append(key)
+        return decorator
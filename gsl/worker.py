@@ -0,0 +1,219 @@
+"""A persistent worker process serving JSON-RPC 2.0 requests, one per line, on stdin and stdout."""
+
+from contextlib import redirect_stdout
+import importlib
+import json
+import os
+import sys
+import time
+import traceback
+
+from .antlr import GrammarRegistry
+from .profiling import Profiler
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+
+class RequestError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def _stamp(file):
+    stat = os.stat(file)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class Worker(object):
+    """Handles requests; its public methods (see `methods`) take the requests' params as arguments."""
+
+    def __init__(self):
+        self.grammars = GrammarRegistry()
+        self.running = True
+        self._objects = {}
+        self._models = {}
+        self.methods = {
+            'register_grammar': self.register_grammar,
+            'parse': self.parse,
+            'load_yaml': self.load_yaml,
+            'run': self.run,
+            'stats': self.stats,
+            'shutdown': self.shutdown,
+        }
+
+    def resolve(self, name):
+        """Imports `module:attribute`, once."""
+
+        try:
+            return self._objects[name]
+        except KeyError:
+            pass
+
+        module, sep, attribute = name.partition(':')
+        if not sep:
+            raise RequestError(INVALID_PARAMS, f"expected 'module:attribute': {name}")
+        result = importlib.import_module(module)
+        for part in attribute.split('.'):
+            result = getattr(result, part)
+        self._objects[name] = result
+        return result
+
+    def _model(self, id, file, load):
+        stamp = _stamp(file)
+        try:
+            cached_stamp, _ = self._models[id]
+        except KeyError:
+            pass
+        else:
+            if cached_stamp == stamp:
+                return True
+        self._models[id] = stamp, load()
+        return False
+
+    def model(self, id):
+        try:
+            _, model = self._models[id]
+        except KeyError:
+            raise RequestError(INVALID_PARAMS, f"no model loaded as '{id}'") from None
+        return model
+
+    # methods
+
+    def register_grammar(self, name, grammar, extensions=()):
+        self.grammars.register(name, grammar, extensions)
+        return {}
+
+    def parse(self, file, rule, visitor=None, listener=None, grammar=None, encoding='utf-8', id=None):
+        """Parses the file with the named (or extension's) grammar and visitor or listener, keeping the model."""
+
+        if (visitor is None) == (listener is None):
+            raise RequestError(INVALID_PARAMS, "exactly one of visitor and listener is required")
+        antlr = self.grammars.antlr(grammar) if grammar is not None else self.grammars.for_file(file)
+
+        def load():
+            input = antlr.file_stream(file, encoding)
+            if visitor is not None:
+                return getattr(antlr.parser(input), rule)().accept(self.resolve(visitor)())
+            else:
+                return antlr.build(input, rule, self.resolve(listener)())
+
+        cached = self._model(file if id is None else id, file, load)
+        return {'cached': cached}
+
+    def load_yaml(self, file, typ='safe', id=None):
+        """Loads the YAML file, and keeps the model as `id`, by default the file name."""
+
+        from .yaml import YAML
+
+        def load():
+            with open(file) as f:
+                return YAML(typ=typ).load(f)
+
+        cached = self._model(file if id is None else id, file, load)
+        return {'cached': cached}
+
+    def run(self, generator, args=(), kwargs=None, models=None):
+        """Calls the generator function with the given arguments, and the loaded models given as {param: id}."""
+
+        kwargs = dict(kwargs or {})
+        for param, id in (models or {}).items():
+            kwargs[param] = self.model(id)
+        with Profiler() as profiler:
+            self.resolve(generator)(*args, **kwargs)
+        return {'outputs': profiler.outputs}
+
+    def stats(self):
+        return {
+            'grammars': self.grammars.load_times,
+            'models': list(self._models),
+            'modules': sorted({name.partition(':')[0] for name in self._objects}),
+        }
+
+    def shutdown(self):
+        self.running = False
+        return {}
+
+    # protocol
+
+    def handle(self, request):
+        """Handles one decoded request, and returns the response, or `None` for notifications."""
+
+        id = None
+        notification = False
+        try:
+            if not isinstance(request, dict) or request.get('jsonrpc') != '2.0' or 'method' not in request:
+                raise RequestError(INVALID_REQUEST, "invalid request")
+            id = request.get('id')
+            notification = 'id' not in request
+            try:
+                method = self.methods[request['method']]
+            except (KeyError, TypeError):
+                raise RequestError(METHOD_NOT_FOUND, f"method not found: {request['method']}") from None
+            params = request.get('params', {})
+
+            start = time.perf_counter()
+            try:
+                with redirect_stdout(sys.stderr):
+                    result = method(*params) if isinstance(params, list) else method(**params)
+            except TypeError as err:
+                # wrong parameters, as opposed to a TypeError raised further down
+                if err.__traceback__.tb_next is None:
+                    raise RequestError(INVALID_PARAMS, str(err)) from None
+                raise
+            result['time'] = time.perf_counter() - start
+        except RequestError as err:
+            error = {'code': err.code, 'message': str(err)}
+        except Exception as err:
+            error = {'code': SERVER_ERROR, 'message': f"{type(err).__name__}: {err}", 'data': traceback.format_exc()}
+        else:
+            return None if notification else {'jsonrpc': '2.0', 'id': id, 'result': result}
+
+        # notifications don't get a response, even if they fail
+        return None if notification else {'jsonrpc': '2.0', 'id': id, 'error': error}
+
+    def serve(self, input=None, output=None):
+        input = sys.stdin if input is None else input
+        output = sys.stdout if output is None else output
+
+        for line in input:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as err:
+                response = {'jsonrpc': '2.0', 'id': None, 'error': {'code': PARSE_ERROR, 'message': str(err)}}
+            else:
+                response = self.handle(request)
+            if response is not None:
+                output.write(json.dumps(response, default=str) + '\n')
+                output.flush()
+            if not self.running:
+                break
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve parse and generation requests as JSON-RPC over stdin/stdout.")
+    parser.add_argument('-g', '--grammar', action='append', default=[], metavar='NAME=MODULE[:EXT,...]',
+                        help="register a grammar, e.g. hedgehog=proto.grammar.Hedgehog:.hh; may be repeated")
+    args = parser.parse_args()
+
+    if '' not in sys.path and os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())
+
+    worker = Worker()
+    for spec in args.grammar:
+        name, _, rest = spec.partition('=')
+        grammar, _, extensions = rest.partition(':')
+        worker.register_grammar(name, grammar, [ext for ext in extensions.split(',') if ext])
+    worker.serve()
+
+
+if __name__ == '__main__':
+    main()
@@ -40,7 +40,7 @@ setup(
 
     # You can just specify the packages manually here if your project is
     # simple. Or you can use find_packages().
-    packages=find_packages(exclude=['contrib', 'docs', 'tests']),
+    packages=find_packages(exclude=['contrib', 'docs', 'tests', 'benchmarks']),
 
     # List run-time dependencies here.  These will be installed by pip when
     # your project is installed. For an analysis of "install_requires" vs pip's
@@ -54,6 +54,7 @@ setup(
         'dev': ['invoke'],
         'antlr': ['antlr4-python3-runtime'],
         'yaml': ['ruamel.yaml'],
+        'numpy': ['numpy'],
     },
 
     # package_data={
@@ -63,6 +64,8 @@ setup(
     entry_points={
         'console_scripts': [
             'g4v = gsl.g4v:main',
+            'gsl-check = gsl.check:main',
+            'gsl-worker = gsl.worker:main',
         ],
     },
 )
@@ -10,8 +10,8 @@ def g4v_g4v(context):
 
 @task
 def grammars_tests(context):
-    run("antlr4 -Dlanguage=Python3 -package grammar -visitor -no-listener tests/grammar/SetTest.g4 tests/grammar/ExprTest.g4 tests/grammar/HedgehogTest.g4")
-    run("g4v tests/grammar/ExprTestVisitor.g4v tests/grammar/HedgehogTestVisitor.g4v tests/grammar/SetTestVisitor.g4v")
+    run("antlr4 -Dlanguage=Python3 -package grammar -visitor -no-listener tests/grammar/SetTest.g4 tests/grammar/ExprTest.g4 tests/grammar/CalcTest.g4 tests/grammar/HedgehogTest.g4")
+    run("g4v --listener tests/grammar/ExprTestVisitor.g4v tests/grammar/CalcTestVisitor.g4v tests/grammar/HedgehogTestVisitor.g4v tests/grammar/SetTestVisitor.g4v")
 
 @task
 def grammars_example(context):
@@ -0,0 +1,18 @@
+grammar CalcTest;
+
+expr: expr0 EOF;
+expr0:
+  expr0 (MUL | DIV) expr0 #product |
+  expr0 (ADD | SUB) expr0 #sum |
+  NUMBER #number |
+  LPAR expr0 RPAR #subexpr;
+
+ADD: '+';
+SUB: '-';
+MUL: '*';
+DIV: '/';
+LPAR: '(';
+RPAR: ')';
+NUMBER: [0-9];
+
+WS: [ \t]+ -> channel(HIDDEN);
@@ -1,8 +1,17 @@
 import unittest
+import io
+import json
 import os
+import multiprocessing
+import pickle
+import threading
 
-from gsl import lines, generate, print_to
+from gsl import pseudo_tuple, lines, template, fragment, generate, print_to
 from gsl.dot_dict import DotDict
+from gsl.model import ModelIndex
+from gsl.profiling import Profiler
+from gsl.tracking import Dependencies
+from gsl.aio import aprint_to, agenerate
 from gsl.antlr import Antlr
 from gsl.yaml import YAML
 
@@ -73,85 +82,6 @@ class TestAntlr(unittest.TestCase):
         self.assertEqual(model, [[1], '+', [2, '*', 3], '+', [[[4], '+', [5]]]])
 
     def test_antlr_hedgehog(self):
-        file = '''\
-io.AnalogMessage analog_message = 3 {
-  """Request or reply for one analog sensor's value"""
-
-  uint32 port = 1 {
-    Python: "int";
-    TypeScript: "number";
-  }
-  uint32 value = 2 {
-    Python: "int";
-    TypeScript: "number";
-  }
-  Subscription subscription = 3 {
-    Python: "Subscription";
-    TypeScript: "Subscription";
-  }
-
-  => analog.Request(port)
-    """analog request => analog reply""";
-  <= analog.Reply(port, value)
-    """analog reply""";
-  => analog.Subscribe(port, subscription)
-    """analog subscribe => ack""";
-  <- analog.Update(port, value, subscription)
-    """analog update""";
-}
-
-motor.MotorAction motor_action = 5 {
-  """Command for one motor. By setting a relative or absolute goal position,
-the motor will go into `reached_state` upon reaching the position."""
-
-  uint32 port = 1 {
-    Python: "int";
-    TypeScript: "number";
-  }
-  MotorState state = 2 {
-    Python: "int";
-    TypeScript: "number";
-  }
-  sint32 amount = 3 {
-    Python: "int", "0";
-    TypeScript: "number", "0";
-  }
-  MotorState reached_state = 4 {
-    Python: "int", "POWER";
-    TypeScript: "number", "MotorState.POWER";
-  }
-  oneof position {
-    sint32 relative = 5 {
-      Python: "int";
-      TypeScript: "number";
-    }
-    sint32 absolute = 6 {
-      Python: "int";
-      TypeScript: "number";
-    }
-  }
-
-  => motor.Action(port, state, amount, [reached_state, relative/absolute])
-    """motor action => ack""";
-}
-
-process.ProcessExecuteAction process_execute_action = 20 {
-  """Invoke a process on the controller"""
-
-  repeated string args = 2 {
-    Python: "str";
-    TypeScript: "string[]";
-  }
-  string working_dir = 1 {
-    Python: "str", "None";
-    TypeScript: "string", "undefined";
-  }
-
-  => process.ExecuteAction(*args, [working_dir])
-    """process execute action => process execute reply""";
-}
-'''
-
         from tests.grammar.HedgehogTestLexer import HedgehogTestLexer
         from tests.grammar.HedgehogTestParser import HedgehogTestParser
         from tests.grammar.HedgehogTestVisitor import HedgehogTestVisitor as _HedgehogTestVisitor
@@ -162,7 +92,7 @@ process.ProcessExecuteAction process_execute_action = 20 {
 
         antlr = Antlr(HedgehogTestLexer, HedgehogTestParser)
 
-        p = antlr.parser(antlr.input_stream(file))
+        p = antlr.parser(antlr.input_stream(HEDGEHOG_FILE))
         expr = p.expr()
         model = expr.accept(HedgehogTestVisitor())
 
@@ -172,6 +102,396 @@ process.ProcessExecuteAction process_execute_action = 20 {
             for field in message.fields:
                 print("    {}".format(field))
 
+    def test_antlr_listener(self):
+        from tests.grammar.ExprTestLexer import ExprTestLexer
+        from tests.grammar.ExprTestParser import ExprTestParser
+        from tests.grammar.ExprTestVisitor import ExprTestModelListener as _ExprTestModelListener
+        from tests.grammar.HedgehogTestLexer import HedgehogTestLexer
+        from tests.grammar.HedgehogTestParser import HedgehogTestParser
+        from tests.grammar.HedgehogTestVisitor import HedgehogTestVisitor, HedgehogTestModelListener
+
+        class ExprTestModelListener(_ExprTestModelListener):
+            def buildNumber(self, ctx: ExprTestParser.NumberContext, children):
+                return int(super(ExprTestModelListener, self).buildNumber(ctx, children))
+
+        antlr = Antlr(ExprTestLexer, ExprTestParser)
+
+        model = antlr.build(antlr.input_stream("1 + 2 * 3 + (4 + 5)"), 'expr', ExprTestModelListener())
+        self.assertEqual(model, [[1], '+', [2, '*', 3], '+', [[[4], '+', [5]]]])
+
+        antlr = Antlr(HedgehogTestLexer, HedgehogTestParser)
+
+        p = antlr.parser(antlr.input_stream(HEDGEHOG_FILE))
+        visited = p.expr().accept(HedgehogTestVisitor())
+        built = antlr.build(antlr.input_stream(HEDGEHOG_FILE), 'expr', HedgehogTestModelListener())
+        self.assertEqual(repr(built), repr(visited))
+
+    def test_antlr_listener_left_recursion(self):
+        from tests.grammar.CalcTestLexer import CalcTestLexer
+        from tests.grammar.CalcTestParser import CalcTestParser
+        from tests.grammar.CalcTestVisitor import CalcTestVisitor as _CalcTestVisitor
+        from tests.grammar.CalcTestVisitor import CalcTestModelListener as _CalcTestModelListener
+
+        class CalcTestVisitor(_CalcTestVisitor):
+            def visitNumber(self, ctx: CalcTestParser.NumberContext):
+                return int(super(CalcTestVisitor, self).visitNumber(ctx))
+
+        class CalcTestModelListener(_CalcTestModelListener):
+            def buildNumber(self, ctx: CalcTestParser.NumberContext, children):
+                return int(super(CalcTestModelListener, self).buildNumber(ctx, children))
+
+        antlr = Antlr(CalcTestLexer, CalcTestParser)
+
+        for source, expected in [
+            ("1", 1),
+            ("1 + 2 * 3 - (4 - 5)", [[1, '+', [2, '*', 3]], '-', [4, '-', 5]]),
+            ("1 * 2 * 3 + 4", [[[1, '*', 2], '*', 3], '+', 4]),
+        ]:
+            visited = antlr.parser(antlr.input_stream(source)).expr().accept(CalcTestVisitor())
+            listener = CalcTestModelListener()
+            built = antlr.build(antlr.input_stream(source), 'expr', listener)
+            self.assertEqual(visited, expected)
+            self.assertEqual(built, expected)
+            self.assertEqual(len(listener._stack), 1)
+
+    def test_antlr_registry(self):
+        from gsl.antlr import GrammarRegistry
+
+        registry = GrammarRegistry()
+        registry.register('hedgehog', 'tests.grammar.HedgehogTest', extensions=['hh'])
+        registry.register('expr', 'tests.grammar.ExprTest', extensions=['.expr'])
+
+        self.assertEqual(registry.name_for('motor.hh'), 'hedgehog')
+        with self.assertRaises(ValueError):
+            registry.name_for('motor.txt')
+        self.assertFalse(registry.is_loaded('hedgehog'))
+        self.assertEqual(registry.load_times, {})
+
+        antlr = registry.for_file('motor.hh')
+        self.assertEqual(antlr.Parser.__name__, 'HedgehogTestParser')
+        self.assertIs(registry.antlr('hedgehog'), antlr)
+        self.assertEqual(list(registry.load_times), ['hedgehog'])
+        self.assertFalse(registry.is_loaded('expr'))
+
+    def test_antlr_incremental(self):
+        from antlr4.error.Errors import ParseCancellationException
+        from tests.grammar.HedgehogTestLexer import HedgehogTestLexer
+        from tests.grammar.HedgehogTestParser import HedgehogTestParser
+        from tests.grammar.HedgehogTestVisitor import HedgehogTestVisitor
+
+        antlr = Antlr(HedgehogTestLexer, HedgehogTestParser)
+        incremental = antlr.incremental('expr', 'message', HedgehogTestVisitor())
+
+        def full(text):
+            p = antlr.parser(antlr.input_stream(text))
+            return repr(p.expr().accept(HedgehogTestVisitor()))
+
+        text = HEDGEHOG_FILE
+        self.assertEqual(repr(incremental.parse(text)), full(text))
+        self.assertEqual((incremental.parsed, incremental.reused), (3, 0))
+
+        first_message = HEDGEHOG_FILE[:HEDGEHOG_FILE.index("motor.MotorAction")]
+        edits = [
+            # change a field of the second message: only that message is parsed
+            (lambda text: text.replace("sint32 amount = 3", "sint64 amount = 3"), 1),
+            # insert whitespace between messages
+            (lambda text: text.replace("}\n\nmotor.", "}\n\n\n\nmotor."), 0),
+            # append a copy of the first message; it gets its own model, not that of the first message
+            (lambda text: text + first_message, 1),
+            # remove the first message
+            (lambda text: text[len(first_message):], 0),
+        ]
+        for edit, parsed in edits:
+            text = edit(text)
+            models = incremental.parse(text)
+            self.assertEqual(repr(models), full(text))
+            self.assertEqual(incremental.parsed, parsed)
+            self.assertEqual(len({id(model) for model in models}), len(models))
+
+        with self.assertRaises(ParseCancellationException):
+            incremental.parse(text.replace('}', '', 1))
+
+        # reparsed messages get their positions in the whole text
+        class LineVisitor(HedgehogTestVisitor):
+            def visitMessage(self, ctx):
+                return ctx.start.line, ctx.start.column, super(LineVisitor, self).visitMessage(ctx)
+
+        incremental = antlr.incremental('expr', 'message', LineVisitor())
+        incremental.parse(HEDGEHOG_FILE)
+        text = HEDGEHOG_FILE.replace("sint32 amount = 3", "sint64 amount = 3")
+        lines = [model[:2] for model in incremental.parse(text)]
+        self.assertEqual(incremental.parsed, 1)
+        expected = antlr.parser(antlr.input_stream(text)).expr().accept(LineVisitor())
+        self.assertEqual(lines, [model[:2] for model in expected])
+        self.assertEqual(repr(incremental.parse(HEDGEHOG_FILE)), full(HEDGEHOG_FILE))
+
+        # a line comment inserted after the first message comments out the second one
+        text = "a.A a = 1 {} b.B b = 2 {}\n"
+        self.assertEqual(len(incremental.parse(text)), 2)
+        text = text.replace("} ", "}// ", 1)
+        self.assertEqual(repr(incremental.parse(text)), full(text))
+        self.assertEqual(len(incremental.parse(text)), 1)
+
+    def test_antlr_streaming(self):
+        import gc
+        import weakref
+        from tests.grammar.HedgehogTestLexer import HedgehogTestLexer
+        from tests.grammar.HedgehogTestParser import HedgehogTestParser
+        from tests.grammar.HedgehogTestVisitor import HedgehogTestVisitor
+
+        class StreamingVisitor(HedgehogTestVisitor):
+            # what `g4v --streaming expr` generates
+            def visitExpr(self, ctx):
+                return self.streamNodes(self.get_children(ctx, HedgehogTestParser.MessageContext))
+
+        antlr = Antlr(HedgehogTestLexer, HedgehogTestParser)
+        p = antlr.parser(antlr.input_stream(HEDGEHOG_FILE))
+        expected = [repr(message) for message in p.expr().accept(HedgehogTestVisitor())]
+
+        p = antlr.parser(antlr.input_stream(HEDGEHOG_FILE))
+        tree = p.expr()
+        fields = [weakref.ref(message.field(0)) for message in tree.message()]
+        models = tree.accept(StreamingVisitor())
+
+        self.assertEqual(repr(next(models)), expected[0])
+        gc.collect()
+        self.assertEqual([field() is None for field in fields], [True, False, False])
+        self.assertEqual([repr(message) for message in models], expected[1:])
+        gc.collect()
+        self.assertTrue(all(field() is None for field in fields))
+        self.assertIsNone(tree.message(0).children)
+
+    def test_antlr_parallel(self):
+        from unittest import mock
+        from antlr4.error.Errors import ParseCancellationException
+        from tests.grammar.HedgehogTestLexer import HedgehogTestLexer
+        from tests.grammar.HedgehogTestParser import HedgehogTestParser
+        from tests.grammar.HedgehogTestVisitor import HedgehogTestVisitor
+
+        antlr = Antlr(HedgehogTestLexer, HedgehogTestParser)
+        text = HEDGEHOG_FILE * 20
+
+        chunks = antlr.split_items(text, 'message', len(HEDGEHOG_FILE))
+        self.assertEqual(len(chunks), 20)
+        self.assertTrue(all(text.startswith('io.AnalogMessage', offset) for offset, _, _ in chunks))
+        self.assertEqual(chunks[1][1:], (HEDGEHOG_FILE.count('\n') + 1, 0))
+        # brackets in strings don't count
+        unit = HEDGEHOG_FILE.replace('"int"', '"{int"')
+        self.assertEqual([offset for offset, _, _ in antlr.split_items(unit * 20, 'message', len(unit))],
+                         [len(unit) * i for i in range(20)])
+
+        class LocalVisitor(HedgehogTestVisitor):
+            pass
+
+        with self.assertRaises(TypeError):
+            antlr.parse_parallel(text, 'message', LocalVisitor, jobs=2)
+
+        p = antlr.parser(antlr.input_stream(text))
+        expected = repr(p.expr().accept(HedgehogTestVisitor()))
+        model = antlr.parse_parallel(text, 'message', HedgehogTestVisitor, jobs=2, chunk_size=len(HEDGEHOG_FILE) * 3)
+        self.assertEqual(repr(model), expected)
+
+        # the error is reported at its position in the whole text
+        text = HEDGEHOG_FILE * 10 + HEDGEHOG_FILE.replace("uint32 value = 2", "uint32 value 2") + HEDGEHOG_FILE * 9
+        with self.assertRaises(ParseCancellationException) as full_error:
+            antlr.parser(antlr.input_stream(text)).expr()
+        with self.assertRaises(ParseCancellationException) as parallel_error:
+            antlr.parse_parallel(text, 'message', HedgehogTestVisitor, jobs=2, chunk_size=len(HEDGEHOG_FILE) * 3)
+        self.assertEqual(str(parallel_error.exception).split(' ')[:2], str(full_error.exception).split(' ')[:2])
+
+        # a field looks like the start of a message; a split there makes the chunks fail, not the result change
+        unit = "A a = 1 {\n  B b = 2 {}\n}\n"
+        text = unit * 8
+        p = antlr.parser(antlr.input_stream(text))
+        expected = repr(p.expr().accept(HedgehogTestVisitor()))
+        chunks = [(0, 1, 0), (len(unit) * 4, 13, 0), (len(unit) * 4 + unit.index('B'), 14, 2)]
+        with mock.patch.object(Antlr, 'split_items', lambda self, text, item, size: chunks):
+            model = antlr.parse_parallel(text, 'message', HedgehogTestVisitor, jobs=2)
+        self.assertEqual(repr(model), expected)
+
+    def test_antlr_service(self):
+        import time
+        from antlr4.dfa.DFA import DFA
+        from gsl.antlr import ParsingService
+        from tests.grammar.HedgehogTestLexer import HedgehogTestLexer
+        from tests.grammar.HedgehogTestParser import HedgehogTestParser
+        from tests.grammar.HedgehogTestVisitor import HedgehogTestVisitor
+
+        antlr = Antlr(HedgehogTestLexer, HedgehogTestParser)
+        service = ParsingService(antlr)
+
+        p = antlr.parser(antlr.input_stream(HEDGEHOG_FILE))
+        expected = repr(p.expr().accept(HedgehogTestVisitor()))
+
+        def run(threads, parses):
+            results = []
+
+            def work():
+                for _ in range(parses):
+                    model = service.parse(antlr.input_stream(HEDGEHOG_FILE), 'expr', HedgehogTestVisitor())
+                    results.append(repr(model))
+
+            workers = [threading.Thread(target=work) for _ in range(threads)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            return results
+
+        # start with empty DFA caches, so that the threads fill them concurrently; other tests get the old ones back
+        dfas = list(HedgehogTestParser.decisionsToDFA)
+        self.addCleanup(HedgehogTestParser.decisionsToDFA.__setitem__, slice(None), dfas)
+        HedgehogTestParser.decisionsToDFA[:] = [
+            DFA(state, decision) for decision, state in enumerate(HedgehogTestParser.atn.decisionToState)
+        ]
+        results = run(8, 10)
+        self.assertEqual(len(results), 80)
+        self.assertTrue(all(result == expected for result in results))
+
+        # with warm caches, the locks don't serialize the threads worse than running the same parses in one thread;
+        # detailed throughput is measured by the antlr.service benchmarks
+        start = time.perf_counter()
+        results = run(1, 160)
+        single = time.perf_counter() - start
+        start = time.perf_counter()
+        results += run(8, 20)
+        threaded = time.perf_counter() - start
+        self.assertTrue(all(result == expected for result in results))
+        self.assertLess(threaded, 3 * single)
+
+    def test_antlr_symbols(self):
+        from gsl.antlr import SymbolTable
+        from tests.grammar.HedgehogTestLexer import HedgehogTestLexer
+        from tests.grammar.HedgehogTestParser import HedgehogTestParser
+        from tests.grammar.HedgehogTestVisitor import HedgehogTestVisitor
+
+        antlr = Antlr(HedgehogTestLexer, HedgehogTestParser)
+
+        symbols = SymbolTable()
+        p = antlr.parser(antlr.input_stream(HEDGEHOG_FILE))
+        model = p.expr().accept(HedgehogTestVisitor(symbols=symbols))
+
+        port = model[0].fields[0]
+        value = model[0].fields[1]
+        self.assertEqual(port.fieldType, 'uint32')
+        self.assertIs(port.fieldType, value.fieldType)
+        self.assertIs(model[0].fields[2].label, model[1].fields[2].label)
+        self.assertEqual(symbols[symbols.id('uint32')], 'uint32')
+
+    def test_antlr_multiprocessing(self):
+        from tests.grammar.HedgehogTestLexer import HedgehogTestLexer
+        from tests.grammar.HedgehogTestParser import HedgehogTestParser
+        from tests.grammar.HedgehogTestVisitor import HedgehogTestVisitor
+
+        antlr = Antlr(HedgehogTestLexer, HedgehogTestParser)
+
+        p = antlr.parser(antlr.input_stream(HEDGEHOG_FILE * 200))
+        model = p.expr().accept(HedgehogTestVisitor())
+
+        # spawned workers don't inherit the pseudo tuple classes, they have to be found by importing the visitor module
+        with multiprocessing.get_context('spawn').Pool(2) as pool:
+            summary, copy = pool.apply(_message_summary, (model,))
+
+        self.assertEqual(summary, [(type(message).__name__, message.discriminator, len(message.fields))
+                                   for message in model])
+        self.assertEqual(len(copy), len(model))
+        self.assertEqual(type(copy[-1]), type(model[-1]))
+        self.assertEqual(repr(copy[-1]), repr(model[-1]))
+
+    def test_antlr_hidden_free(self):
+        from antlr4 import Token
+        from gsl.antlr import ParseTreeVisitor
+        from tests.grammar.HedgehogTestLexer import HedgehogTestLexer
+        from tests.grammar.HedgehogTestParser import HedgehogTestParser
+
+        antlr = Antlr(HedgehogTestLexer, HedgehogTestParser)
+
+        stream = antlr.token_stream(antlr.input_stream(HEDGEHOG_FILE), hidden=False)
+        stream.fill()
+        self.assertFalse(any(token.channel == Token.HIDDEN_CHANNEL for token in stream.tokens))
+
+        p = antlr.parser(antlr.input_stream(HEDGEHOG_FILE), hidden=False)
+        message = p.expr().message(0)
+        end = HEDGEHOG_FILE.index('}\n\nmotor') + 1
+        visitor = ParseTreeVisitor()
+        self.assertEqual(visitor.get_full_text(message), HEDGEHOG_FILE[:end])
+        self.assertIs(visitor.get_full_text(message), visitor.get_full_text(message))
+        self.assertEqual(visitor.get_full_text(message.DOCSTRING()),
+                         '"""Request or reply for one analog sensor\'s value"""')
+
+    def test_antlr_check(self):
+        from tests.grammar.HedgehogTestLexer import HedgehogTestLexer
+        from tests.grammar.HedgehogTestParser import HedgehogTestParser
+
+        antlr = Antlr(HedgehogTestLexer, HedgehogTestParser)
+
+        self.assertEqual(antlr.check(antlr.input_stream(HEDGEHOG_FILE), 'expr'), [])
+
+        errors = antlr.check(antlr.input_stream("""\
+io.AnalogMessage analog_message = 3 {
+  uint32 port = {
+  }
+  uint32 value = 2 {
+    Python: "int" # ;
+  }
+}
+"""), 'expr')
+        # both the parser error in line 2 and the lexer error in line 5 are reported
+        self.assertEqual({line for line, column, msg in errors}, {2, 5})
+        self.assertIn((5, 18), [(line, column) for line, column, msg in errors])
+
+    def test_antlr_profile(self):
+        from tests.grammar.HedgehogTestLexer import HedgehogTestLexer
+        from tests.grammar.HedgehogTestParser import HedgehogTestParser
+
+        antlr = Antlr(HedgehogTestLexer, HedgehogTestParser)
+
+        p = antlr.parser(antlr.input_stream(HEDGEHOG_FILE), profile=True)
+        p.expr()
+        profile = antlr.decision_profile(p)
+
+        self.assertEqual(len(profile.decisions), len(p.decisionsToDFA))
+        self.assertTrue(all(info.rule in HedgehogTestParser.ruleNames for info in profile.decisions))
+        self.assertGreater(sum(info.invocations for info in profile.decisions), 0)
+        rules = profile.rules()
+        self.assertEqual(sum(rule.invocations for rule in rules), sum(info.invocations for info in profile.decisions))
+
+        report = list(profile.report())
+        self.assertEqual(report[0], "decisions")
+
+    def test_antlr_warm_up(self):
+        from tests.grammar.HedgehogTestLexer import HedgehogTestLexer
+        from tests.grammar.HedgehogTestParser import HedgehogTestParser
+
+        antlr = Antlr(HedgehogTestLexer, HedgehogTestParser)
+
+        stats = antlr.warm_up([HEDGEHOG_FILE], 'expr').totals()
+        self.assertEqual(stats.decisions, len(HedgehogTestParser.decisionsToDFA))
+        self.assertGreater(stats.states, 0)
+        self.assertGreater(stats.lexer_states, 0)
+        self.assertGreater(stats.predictions, 0)
+
+        # the DFA covers the corpus now, only full context predictions still need the ATN
+        again = antlr.warm_up([antlr.input_stream(HEDGEHOG_FILE)], 'expr').totals()
+        self.assertEqual((again.states, again.edges), (stats.states, stats.edges))
+        self.assertEqual(again.predictions, stats.predictions)
+        self.assertEqual(again.ATN_Fallback, again.LL_Fallback)
+
+        # a malformed input is counted, and doesn't stop the warm-up
+        corpus = [HEDGEHOG_FILE.replace('}', '', 1), HEDGEHOG_FILE]
+        with_failure = antlr.warm_up(corpus, 'expr')
+        self.assertEqual(with_failure.failures, 1)
+        self.assertGreater(with_failure.totals().predictions, stats.predictions)
+        self.assertIn("1 inputs failed to parse", list(with_failure.report())[-1])
+
+        p = antlr.parser(antlr.input_stream(HEDGEHOG_FILE), count=True)
+        p.expr()
+        self.assertEqual(antlr.dfa_statistics(p).totals().predictions, stats.predictions)
+        self.assertEqual(antlr.dfa_statistics().totals().predictions, 0)
+        self.assertEqual(list(antlr.dfa_statistics(p).report())[0], "decisions")
+        with self.assertRaises(ValueError):
+            antlr.parser(antlr.input_stream(HEDGEHOG_FILE), profile=True, count=True)
+
 
 class TestGenerate(unittest.TestCase):
     def assertFileEqual(self, file, content):
@@ -269,3 +589,691 @@ newest generated footer
 """)
 
         os.remove('tests/test_output')
+
+    def test_generate_streaming(self):
+        import glob
+
+        old = """\
+header
+# <GSL customizable: section1>
+CUSTOMIZED section1
+# </GSL customizable: section1>
+# <GSL customizable: section2 />
+# <GSL customizable: section3>
+CUSTOMIZED section3
+# </GSL customizable: section3>
+footer
+"""
+
+        def new_code(*names):
+            def code():
+                yield "new header"
+                for name in names:
+                    yield f"# <default GSL customizable: {name}>"
+                    yield f"default {name}"
+                    yield f"# </GSL customizable: {name}>"
+                yield "new footer"
+            return code
+
+        for names in [('section1', 'section2', 'section3'),
+                      ('section3', 'section1'),
+                      ('section0', 'section2', 'section1')]:
+            results = []
+            for streaming in (False, True):
+                with open('tests/test_output', 'w') as f:
+                    f.write(old)
+                generate('tests/test_output', streaming=streaming)(new_code(*names))
+                with open('tests/test_output') as f:
+                    results.append(f.read())
+            indexed, streamed = results
+            self.assertEqual(streamed, indexed)
+            self.assertEqual(glob.glob('tests/test_output.*.gsl-new'), [])
+
+        with open('tests/test_output', 'w') as f:
+            f.write(old)
+        with self.assertRaises(ValueError):
+            generate('tests/test_output', streaming=True)(new_code('section1', 'section1'))
+        self.assertFileEqual('tests/test_output', old)
+        self.assertEqual(glob.glob('tests/test_output.*.gsl-new'), [])
+
+        # the replaced file keeps its permissions
+        os.chmod('tests/test_output', 0o640)
+        generate('tests/test_output', streaming=True)(new_code('section1'))
+        self.assertEqual(os.stat('tests/test_output').st_mode & 0o777, 0o640)
+
+        os.remove('tests/test_output')
+
+    def test_agenerate(self):
+        import asyncio
+        import glob
+
+        with open('tests/test_output', 'w') as f:
+            f.write("""\
+# <GSL customizable: section1>
+CUSTOMIZED section1
+# </GSL customizable: section1>
+""")
+
+        async def main():
+            @agenerate('tests/test_output')
+            async def code():
+                yield "header"
+                await asyncio.sleep(0)
+                yield "# <default GSL customizable: section1>"
+                yield "# </GSL customizable: section1>"
+                yield "# <default GSL customizable: section2 />"
+
+            @aprint_to('tests/test_output2')
+            async def code2():
+                for i in range(5000):
+                    yield f"line {i}"
+
+            await asyncio.gather(code, code2)
+
+        asyncio.run(main())
+
+        self.assertFileEqual('tests/test_output', """\
+header
+# <GSL customizable: section1>
+CUSTOMIZED section1
+# </GSL customizable: section1>
+# <default GSL customizable: section2 />
+""")
+        self.assertFileEqual('tests/test_output2', ''.join(f"line {i}\n" for i in range(5000)))
+
+        # a failing generator leaves the old file, and its customized sections, untouched
+        async def fail():
+            @agenerate('tests/test_output')
+            async def code():
+                yield "# <default GSL customizable: section1>"
+                raise RuntimeError("failed")
+
+            await code
+
+        with self.assertRaises(RuntimeError):
+            asyncio.run(fail())
+        with open('tests/test_output') as f:
+            self.assertIn("CUSTOMIZED section1", f.read())
+        self.assertEqual(glob.glob('tests/test_output.*.gsl-new'), [])
+
+        # the replaced file keeps its permissions
+        os.chmod('tests/test_output', 0o640)
+        asyncio.run(main())
+        self.assertEqual(os.stat('tests/test_output').st_mode & 0o777, 0o640)
+
+        os.remove('tests/test_output')
+        os.remove('tests/test_output2')
+
+    def test_generate_profiler(self):
+        with open('tests/test_output', 'w') as f:
+            f.write("""\
+# <GSL customizable: section1>
+CUSTOMIZED section1
+# </GSL customizable: section1>
+# <GSL customizable: section3 />
+""")
+
+        def header_code():
+            yield from lines("""\
+generated header""")
+
+        with Profiler() as profiler:
+            @generate('tests/test_output')
+            def code():
+                yield from header_code()
+                yield from lines("""\
+# <default GSL customizable: section1 />
+# <default GSL customizable: section2 />
+""")
+
+        output, = profiler.outputs
+        self.assertEqual(output.file, 'tests/test_output')
+        self.assertEqual(output.function.split('.')[-1], 'code')
+        self.assertEqual(output.kind, 'generate')
+        self.assertEqual(output.lines, 5)
+        self.assertEqual(output.sections, {'preserved': 1, 'reset': 1, 'dropped': 1})
+        fragments = {name.split('.')[-1]: fragment for name, fragment in output.fragments.items()}
+        self.assertEqual(fragments['header_code'].lines, 1)
+
+        event, = profiler.to_trace()['traceEvents']
+        self.assertEqual(event['ph'], 'X')
+        self.assertEqual(event['args']['lines'], 5)
+
+        # threads sharing a profiler record into their own outputs
+        barrier = threading.Barrier(2)
+
+        def first_code():
+            yield from lines("first")
+
+        def second_code():
+            yield from lines("second\nsecond")
+
+        def work(file, helper):
+            with profiler:
+                @print_to(file)
+                def code():
+                    barrier.wait()
+                    yield from helper()
+
+        threads = [threading.Thread(target=work, args=args)
+                   for args in [('tests/test_output', first_code), ('tests/test_output2', second_code)]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        outputs = {output.file: output for output in profiler.outputs[1:]}
+        for file, name, count in [('tests/test_output', 'first_code', 1), ('tests/test_output2', 'second_code', 2)]:
+            self.assertEqual(outputs[file].lines, count)
+            self.assertEqual([name.split('.')[-1] for name in outputs[file].fragments], [name])
+
+        os.remove('tests/test_output')
+        os.remove('tests/test_output2')
+
+    def test_generate_tracked(self):
+        Message = pseudo_tuple('Message', ('name', 'fields'))
+        Field = pseudo_tuple('Field', ('name', 'type'))
+
+        def make_model(port_type):
+            return [
+                Message('Analog', [Field('port', port_type), Field('value', 'uint32')]),
+                Message('Digital', [Field('port', 'uint32')]),
+            ]
+
+        files = {'Analog': 'tests/test_output', 'Digital': 'tests/test_output2'}
+
+        def run(model):
+            with Dependencies('tests/test_output.deps') as deps:
+                for message in model:
+                    @deps.generate(files[message.name], message=message)
+                    def code(message):
+                        yield f"message {message.name}"
+                        for field in message.fields:
+                            if isinstance(field, Field):
+                                yield f"  {field.type} {field.name}"
+            return deps
+
+        deps = run(make_model('uint32'))
+        self.assertEqual(deps.generated, ['tests/test_output', 'tests/test_output2'])
+        self.assertFileEqual('tests/test_output', "message Analog\n  uint32 port\n  uint32 value\n")
+
+        deps = run(make_model('uint32'))
+        self.assertEqual(deps.generated, [])
+        self.assertEqual(deps.skipped, ['tests/test_output', 'tests/test_output2'])
+
+        deps = run(make_model('uint8'))
+        self.assertEqual(deps.generated, ['tests/test_output'])
+        self.assertFileEqual('tests/test_output', "message Analog\n  uint8 port\n  uint32 value\n")
+
+        os.remove('tests/test_output')
+        deps = run(make_model('uint8'))
+        self.assertEqual(deps.generated, ['tests/test_output'])
+
+        for file in ('tests/test_output', 'tests/test_output2', 'tests/test_output.deps'):
+            os.remove(file)
+
+    def test_generate_tracked_changes(self):
+        def field_line(field):
+            return f"  {field.type} {field.name}"
+
+        def field_line_colon(field):
+            return f"  {field.name}: {field.type}"
+
+        def run(model, line):
+            with Dependencies('tests/test_output.deps') as deps:
+                @deps.generate('tests/test_output', message=model)
+                def code(message):
+                    yield f"message {message.name} {message.get('doc')} {message.flag}"
+                    for field in message.fields:
+                        yield line(field)
+                    yield f"options {message.options['packed']} {sorted(message.tags)}"
+            return deps
+
+        def make_model(doc=None, flag=True, packed=False, tags=('a',)):
+            model = DotDict(name='Analog', flag=flag, fields=[DotDict(name='port', type='uint32')],
+                            options={'packed': packed}, tags=set(tags))
+            if doc is not None:
+                model.doc = doc
+            return model
+
+        self.addCleanup(os.remove, 'tests/test_output')
+        self.addCleanup(os.remove, 'tests/test_output.deps')
+
+        self.assertEqual(run(make_model(), field_line).generated, ['tests/test_output'])
+        self.assertEqual(run(make_model(), field_line).skipped, ['tests/test_output'])
+        # a changed helper function, values that only compare equal, or look like markers, and nested changes
+        for model, line in [
+            (make_model(), field_line_colon),
+            (make_model(flag=1), field_line_colon),
+            (make_model(flag=1, doc='#missing'), field_line_colon),
+            (make_model(flag=1, doc='#missing', packed=0), field_line_colon),
+            (make_model(flag=1, doc='#missing', packed=0, tags=('b',)), field_line_colon),
+        ]:
+            self.assertEqual(run(model, line).generated, ['tests/test_output'])
+        self.assertFileEqual('tests/test_output', "message Analog #missing 1\n  port: uint32\noptions 0 ['b']\n")
+        self.assertEqual(run(make_model(flag=1, doc='#missing', packed=0, tags=('b',)), line).skipped,
+                         ['tests/test_output'])
+
+    def test_generate_tracked_whole(self):
+        def run(model):
+            with Dependencies('tests/test_output.deps') as deps:
+                @deps.generate('tests/test_output', m=model)
+                def code(m):
+                    yield "default" if m['xs'] == [1, 2] else "custom"
+                    yield ' '.join(map(str, m['items'] + ['end']))
+                    yield ' '.join(map(str, ['start'] + m['items'] * 2))
+            return deps
+
+        self.addCleanup(os.remove, 'tests/test_output')
+        self.addCleanup(os.remove, 'tests/test_output.deps')
+
+        self.assertEqual(run({'xs': [1, 2], 'items': ['a']}).generated, ['tests/test_output'])
+        self.assertEqual(run({'xs': [1, 2], 'items': ['a']}).skipped, ['tests/test_output'])
+        self.assertEqual(run({'xs': [3, 4], 'items': ['a']}).generated, ['tests/test_output'])
+        self.assertFileEqual('tests/test_output', "custom\na end\nstart a a\n")
+        self.assertEqual(run({'xs': [3, 4], 'items': ['b']}).generated, ['tests/test_output'])
+        self.assertFileEqual('tests/test_output', "custom\nb end\nstart b b\n")
+
+
+class TestTemplate(unittest.TestCase):
+    def test_template(self):
+        Class = type('Class', (), {'name': 'HelloWorld'})
+
+        method_code = template("""\
+public void {name}() {{
+    // TODO
+}}""")
+        class_code = template("""\
+public class {cls.name} {{
+    {members}
+
+    // {value!r:>6} {values[0]} {values[key]}
+}}""")
+
+        code = class_code(cls=Class, members=method_code(name='bar'), value='x', values={0: 1, 'key': 2})
+        self.assertEqual(list(code), list(lines("""\
+public class HelloWorld {
+    public void bar() {
+        // TODO
+    }
+
+    //    'x' 1 2
+}""")))
+
+        self.assertEqual(list(template("\n\n")()), list(lines("\n\n")))
+        with self.assertRaises(ValueError):
+            template("{}")
+        with self.assertRaises(ValueError):
+            template("{_private}")
+        with self.assertRaises(ValueError):
+            template("{class}")
+
+        # placeholders alone on their line may be scalars, and names don't shadow what the template uses
+        self.assertEqual(list(template("  {x}")(x=5)), ["  5"])
+        self.assertEqual(list(template("{str}")(str='a')), ["a"])
+        self.assertEqual(list(template("{str}")(str=['a', 'b'])), ["a", "b"])
+        self.assertEqual(list(template("{isinstance}")(isinstance=None)), ["None"])
+
+    def test_fragment(self):
+        Field = pseudo_tuple('Field', ('name', 'type'))
+        calls = []
+
+        @fragment(maxsize=2)
+        def field_code(field):
+            calls.append(field.name)
+            yield from lines(f"""\
+private {field.type} {field.name};""")
+
+        port, value, subscription = Field('port', 'int'), Field('value', 'int'), Field('subscription', 'Subscription')
+        code = field_code(port)
+        self.assertEqual(code, ["private int port;"])
+        code.append("modified")
+        self.assertEqual(field_code(port), ["private int port;"])
+        self.assertEqual(field_code(Field('port', 'int')), ["private int port;"])
+        self.assertEqual(calls, ['port', 'port'])
+
+        field_code(value)
+        field_code(subscription)
+        field_code(port)
+        self.assertEqual(calls, ['port', 'port', 'value', 'subscription', 'port'])
+        self.assertEqual(field_code.cache_info(), {'hits': 1, 'misses': 5, 'maxsize': 2, 'size': 2})
+
+        @fragment(key=lambda field: (field.name, field.type))
+        def structural_code(field):
+            calls.append(field.name)
+            yield field.name
+
+        calls.clear()
+        structural_code(port)
+        structural_code(Field('port', 'int'))
+        self.assertEqual(calls, ['port'])
+        self.assertEqual(structural_code.cache_info().hits, 1)
+        structural_code.cache_clear()
+        self.assertEqual(structural_code.cache_info(), {'hits': 0, 'misses': 0, 'maxsize': 128, 'size': 0})
+
+
+class TestPseudoTuple(unittest.TestCase):
+    def test_pickle(self):
+        Field = pseudo_tuple('Field', ('name', 'type'))
+
+        field = Field('port', type='uint32')
+        field.extra = [1, 2]
+        copy = pickle.loads(pickle.dumps([field, Field('value')], protocol=5))
+
+        self.assertIs(type(copy[0]), Field)
+        self.assertEqual(tuple(copy[0]), ('port', 'uint32'))
+        self.assertEqual(copy[0].extra, [1, 2])
+        self.assertEqual(repr(copy[1]), "Field(name='value', type=None)")
+
+    def test_registry(self):
+        import gc
+        import warnings
+        from gsl import _pseudo_tuples
+
+        # creating the same pseudo tuple repeatedly is fine, and the registry doesn't keep the classes alive
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            classes = [pseudo_tuple('Temp', ('value',)) for _ in range(2)]
+        key = (__name__, classes[0].__qualname__, ('value',))
+        self.assertIs(_pseudo_tuples[key], classes[1])
+        del classes
+        gc.collect()
+        self.assertNotIn(key, _pseudo_tuples)
+
+        # a different definition with the same name and fields would make unpickling ambiguous
+        Temp = pseudo_tuple('Temp', ('value',))
+        with self.assertWarns(RuntimeWarning):
+            Other = pseudo_tuple('Temp', ('value',))
+        self.assertIs(type(pickle.loads(pickle.dumps(Other(1)))), Other)
+        self.assertIsNot(Temp, Other)
+
+
+class TestG4V(unittest.TestCase):
+    def test_static_class(self):
+        import sys
+        import types
+        from gsl.g4v import static_class_code
+
+        # a module, so that the static class can be pickled by reference like the generated ones
+        module = types.ModuleType('tests.static_model')
+        sys.modules[module.__name__] = module
+        self.addCleanup(sys.modules.pop, module.__name__)
+        exec('\n'.join(static_class_code('Field', ('name', 'type'))), module.__dict__)
+        Field = module.Field
+        PseudoField = pseudo_tuple('Field', ('name', 'type'))
+
+        for args, kwargs in [(('port',), {}), (('port', 'uint32'), {'extra': [1]}), ((), {'type': 'uint32'})]:
+            static, pseudo = Field(*args, **kwargs), PseudoField(*args, **kwargs)
+            self.assertEqual(repr(static), repr(pseudo))
+            self.assertEqual(str(static), str(pseudo))
+            self.assertEqual(tuple(static), tuple(pseudo))
+            self.assertEqual(static == Field(*args, **kwargs), pseudo == PseudoField(*args, **kwargs))
+            self.assertEqual(static, static)
+
+            copy = pickle.loads(pickle.dumps(static))
+            self.assertIs(type(copy), Field)
+            self.assertEqual(repr(copy), repr(pickle.loads(pickle.dumps(pseudo))))
+
+        static, pseudo = Field('port', 'uint32'), PseudoField('port', 'uint32')
+        static.extra = pseudo.extra = 1
+        self.assertEqual(repr(static), repr(pseudo))
+        # the same errors as pseudo tuples
+        for args, kwargs in [(('port', 'uint32', 'extra'), {}), (('port',), {'name': 'value'})]:
+            with self.assertRaises(ValueError) as static_error:
+                Field(*args, **kwargs)
+            with self.assertRaises(ValueError) as pseudo_error:
+                PseudoField(*args, **kwargs)
+            self.assertEqual(str(static_error.exception), str(pseudo_error.exception))
+
+    def test_streaming_option(self):
+        import tempfile
+        from gsl.g4v import generate_code
+
+        with tempfile.TemporaryDirectory() as directory:
+            in_file = os.path.join(directory, 'StreamingTestVisitor.g4v')
+            with open(in_file, 'w') as f:
+                f.write("visitor StreamingTestVisitor for grammar HedgehogTest;\n"
+                        "expr = [message*];\n"
+                        "message = Message(fields=field*);\n"
+                        "field = {name: `name`};\n"
+                        "qualifiedIdentifier = identifier*;\n")
+            for rule in ('expr', 'message', 'field', 'number'):
+                with self.assertRaisesRegex(ValueError, f"'{rule}'"):
+                    generate_code(in_file, streaming=[rule])
+            generate_code(in_file, streaming=['qualifiedIdentifier'])
+            with open(os.path.join(directory, 'StreamingTestVisitor.py')) as f:
+                self.assertIn("self.streamNodes(", f.read())
+
+
+class TestModel(unittest.TestCase):
+    def test_model_index(self):
+        Message = pseudo_tuple('Message', ('name', 'fields'))
+        Field = pseudo_tuple('Field', ('name', 'type'))
+
+        model = [
+            Message('Request', [Field('port', 'uint32'), Field('reply', 'Reply')]),
+            Message('Reply', [Field('value', 'uint32')]),
+            DotDict(name='Reply', options=[DotDict(name='deprecated')]),
+        ]
+        index = ModelIndex(model)
+
+        self.assertEqual(len(index), 7)
+        self.assertEqual([field.name for field in index.of_type(Field)], ['port', 'reply', 'value'])
+        self.assertEqual([node.name for node in index.of_type(Message, Field)], ['Request', 'port', 'reply', 'Reply', 'value'])
+        self.assertIs(index.get(Message, name='Reply'), model[1])
+        self.assertEqual(index.find(name='Reply'), [model[1], model[2]])
+        self.assertEqual(index.find(Field, type='uint32', name='value'), [model[1].fields[0]])
+        self.assertIsNone(index.get(Message, name='Update'))
+        self.assertEqual(index.find(Message, fields=[Field('value', 'uint32')]), [])
+        self.assertEqual(index.find(fields=model[1].fields), [model[1]])
+        self.assertEqual(index.find(options=[DotDict(name='deprecated')], name='Reply'), [model[2]])
+        self.assertEqual(index.find(fields=()), [])
+        self.assertIs(index.parent(model[0].fields[1]), model[0])
+        self.assertIsNone(index.parent(model[0]))
+        self.assertEqual(list(index.ancestors(model[2].options[0])), [model[2]])
+        self.assertIsNone(index.ancestor(model[1].fields[0], DotDict))
+        with self.assertRaises(ValueError):
+            index.parent(Field('port', 'uint32'))
+
+    def test_model_table(self):
+        from gsl.model import ModelTable
+
+        Field = pseudo_tuple('Field', ('name', 'type', 'label', 'options'))
+        fields = [Field(f"field{i}", [None, 'uint32', 'sint32'][i % 3], i, [i]) for i in range(9)]
+        table = ModelTable(Field, fields)
+
+        self.assertEqual(len(table), 9)
+        self.assertEqual(table.dictionary('type'), ['uint32', 'sint32'])
+        self.assertEqual(table.column('type').tolist(), [-1, 0, 1] * 3)
+        self.assertEqual([repr(row) for row in table], [repr(field) for field in fields])
+        self.assertEqual([repr(node) for node in table.nodes()], [repr(field) for field in fields])
+        row = table[-1]
+        self.assertIsInstance(row, Field)
+        self.assertEqual((row.name, row.type, row.label, row.options), ('field8', 'sint32', 8, [8]))
+        self.assertEqual(tuple(row), tuple(fields[8]))
+        with self.assertRaises(AttributeError):
+            row.extra
+
+        self.assertEqual(table.filter(type='uint32').values('label'), [1, 4, 7])
+        self.assertEqual(table.filter(type=['sint32', None, 'bool']).values('label'), [0, 2, 3, 5, 6, 8])
+        self.assertEqual(table.filter(table.column('label') > 4, type='sint32').values('name'), ['field5', 'field8'])
+        self.assertEqual(len(table.filter(type='bool')), 0)
+
+        groups = table.group_by('type')
+        self.assertEqual(list(groups), [None, 'uint32', 'sint32'])
+        self.assertEqual(groups['sint32'].values('label'), [2, 5, 8])
+        self.assertEqual(table.count_by('type', 'label')[('uint32', 4)], 1)
+        self.assertEqual(table.filter(table.column('label') < 2).count_by('type'), {None: 1, 'uint32': 1})
+
+        # more combinations of distinct values than fit into int64 group ids
+        Row = pseudo_tuple('Row', tuple(f"f{i}" for i in range(8)))
+        rows = [Row(*(i * (k + 1) % 1009 for k in range(4)), *(f"{i * (k + 5) % 1009}" for k in range(4)))
+                for i in range(1009)]
+        table = ModelTable(Row, rows + rows[:3])
+        counts = table.count_by(*Row._fields)
+        self.assertEqual(list(counts), [tuple(row) for row in rows])
+        self.assertEqual(counts[tuple(rows[2])], 2)
+        self.assertEqual(counts[tuple(rows[3])], 1)
+        self.assertEqual([row.f7 for row in table.group_by('f7', *Row._fields)[('0', *rows[0])]], ['0', '0'])
+
+        # object values that have an `item` attribute are not NumPy scalars
+        Entry = pseudo_tuple('Entry', ('item', 'count'))
+        Slot = pseudo_tuple('Slot', ('entry', 'index'))
+        table = ModelTable(Slot, [Slot(Entry('a', 1), 0), Slot(Entry('b', 2), 1)])
+        self.assertIsInstance(table[1].entry, Entry)
+        self.assertEqual(table.values('entry')[0].item, 'a')
+        self.assertIs(type(table[1].index), int)
+
+    def test_memory_report(self):
+        from gsl.profiling import MemoryReport
+
+        Message = pseudo_tuple('Message', ('name', 'fields'))
+        Field = pseudo_tuple('Field', ('name', 'type'))
+        field = Field('id', 'uint32')
+        model = [Message(''.join(['msg', str(i)]), [field, Field('value', ''.join(['uint', '32']))]) for i in range(3)]
+        report = MemoryReport(model)
+
+        self.assertEqual(report.classes['Message'].count, 3)
+        self.assertEqual(report.classes['Field'].count, 4)
+        self.assertEqual(report.fields['Message.fields'].count, 3)
+        self.assertGreater(report.fields['Message.fields'].size, 0)
+        self.assertEqual(report.total, sum(cls.size for cls in report.classes.values()))
+        self.assertEqual(report.strings.duplicates, 3)
+        self.assertIn("Message", "\n".join(report.report()))
+        json.dumps(report.to_json())
+
+        report = MemoryReport.measure(YAML(typ='safe').load, "messages: [{name: a, fields: [id]}, {name: b}]")
+        self.assertEqual(report.classes['DotDict'].count, 3)
+        self.assertGreater(report.traced, 0)
+        self.assertGreaterEqual(report.peak, report.traced)
+
+
+class TestWorker(unittest.TestCase):
+    def test_worker(self):
+        from gsl.worker import Worker, METHOD_NOT_FOUND, PARSE_ERROR
+
+        with open('tests/test_output', 'w') as f:
+            f.write("names: [a, b]\n")
+        self.addCleanup(os.remove, 'tests/test_output')
+
+        def request(number, method, **params):
+            return json.dumps({'jsonrpc': '2.0', 'id': number, 'method': method, 'params': params})
+
+        requests = [
+            request(1, 'load_yaml', file='tests/test_output', id='names'),
+            request(2, 'load_yaml', file='tests/test_output', id='names'),
+            request(3, 'run', generator='tests.test:_worker_generator',
+                    kwargs={'file': 'tests/test_output'}, models={'model': 'names'}),
+            request(4, 'compile'),
+            # notifications get no response, whether they succeed or fail
+            json.dumps({'jsonrpc': '2.0', 'method': 'stats'}),
+            json.dumps({'jsonrpc': '2.0', 'method': 'compile'}),
+            "{not json",
+            request(5, 'shutdown'),
+            request(6, 'stats'),
+        ]
+        output = io.StringIO()
+        Worker().serve(io.StringIO('\n'.join(requests) + '\n'), output)
+        responses = [json.loads(line) for line in output.getvalue().splitlines()]
+
+        self.assertEqual([response['id'] for response in responses], [1, 2, 3, 4, None, 5])
+        self.assertFalse(responses[0]['result']['cached'])
+        self.assertTrue(responses[1]['result']['cached'])
+        self.assertGreaterEqual(responses[2]['result']['time'], 0)
+        outputs = responses[2]['result']['outputs']
+        self.assertEqual([(output['file'], output['lines']) for output in outputs], [('tests/test_output', 2)])
+        self.assertEqual(responses[3]['error']['code'], METHOD_NOT_FOUND)
+        self.assertEqual(responses[4]['error']['code'], PARSE_ERROR)
+        with open('tests/test_output') as f:
+            self.assertEqual(f.read(), "name: a\nname: b\n")
+
+
+HEDGEHOG_FILE = '''\
+io.AnalogMessage analog_message = 3 {
+  """Request or reply for one analog sensor's value"""
+
+  uint32 port = 1 {
+    Python: "int";
+    TypeScript: "number";
+  }
+  uint32 value = 2 {
+    Python: "int";
+    TypeScript: "number";
+  }
+  Subscription subscription = 3 {
+    Python: "Subscription";
+    TypeScript: "Subscription";
+  }
+
+  => analog.Request(port)
+    """analog request => analog reply""";
+  <= analog.Reply(port, value)
+    """analog reply""";
+  => analog.Subscribe(port, subscription)
+    """analog subscribe => ack""";
+  <- analog.Update(port, value, subscription)
+    """analog update""";
+}
+
+motor.MotorAction motor_action = 5 {
+  """Command for one motor. By setting a relative or absolute goal position,
+the motor will go into `reached_state` upon reaching the position."""
+
+  uint32 port = 1 {
+    Python: "int";
+    TypeScript: "number";
+  }
+  MotorState state = 2 {
+    Python: "int";
+    TypeScript: "number";
+  }
+  sint32 amount = 3 {
+    Python: "int", "0";
+    TypeScript: "number", "0";
+  }
+  MotorState reached_state = 4 {
+    Python: "int", "POWER";
+    TypeScript: "number", "MotorState.POWER";
+  }
+  oneof position {
+    sint32 relative = 5 {
+      Python: "int";
+      TypeScript: "number";
+    }
+    sint32 absolute = 6 {
+      Python: "int";
+      TypeScript: "number";
+    }
+  }
+
+  => motor.Action(port, state, amount, [reached_state, relative/absolute])
+    """motor action => ack""";
+}
+
+process.ProcessExecuteAction process_execute_action = 20 {
+  """Invoke a process on the controller"""
+
+  repeated string args = 2 {
+    Python: "str";
+    TypeScript: "string[]";
+  }
+  string working_dir = 1 {
+    Python: "str", "None";
+    TypeScript: "string", "undefined";
+  }
+
+  => process.ExecuteAction(*args, [working_dir])
+    """process execute action => process execute reply""";
+}
+'''
+
+
+def _message_summary(model):
+    return [(type(message).__name__, message.discriminator, len(message.fields)) for message in model], model
+
+
+def _worker_generator(model, file):
+    @print_to(file)
+    def code():
+        print("printed output must not end up on stdout")
+        for name in model.names:
+            yield f"name: {name}"